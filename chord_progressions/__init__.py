@@ -15,7 +15,7 @@ logger = logging.getLogger("chord-progressions")
 DEFAULT_BPM = 120
 DEFAULT_MIDI_TICKS_PER_BEAT = 480
 
-from chord_progressions.chord import Chord
+from chord_progressions.chord import Chord, ChordBatch
 from chord_progressions.extract import (
     extract_progression_from_midi,
 )
@@ -27,6 +27,7 @@ from chord_progressions.pitch import (
     get_midi_nums_list_from_midi_nums_str,
     get_notes_list_from_midi_nums_str,
 )
+from chord_progressions.pitch_class_set import PitchClassSet
 from chord_progressions.progression import Progression, DURATIONS
 from chord_progressions.type_templates import (
     TYPE_TEMPLATES,
@@ -39,6 +40,7 @@ from chord_progressions.type_templates import (
 # Use __all__ to let type checkers know what is part of the public API
 __all__ = [
     Chord,
+    ChordBatch,
     extract_progression_from_midi,
     get_midi_num_from_note,
     get_note_from_midi_num,
@@ -46,6 +48,7 @@ __all__ = [
     get_pitch_class_from_note,
     get_midi_nums_list_from_midi_nums_str,
     get_notes_list_from_midi_nums_str,
+    PitchClassSet,
     Progression,
     DURATIONS,
     TYPE_TEMPLATES,
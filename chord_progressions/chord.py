@@ -1,56 +1,236 @@
+import hashlib
+import itertools
+from functools import lru_cache
+from types import MappingProxyType
 from uuid import uuid4
 
+import numpy as np
 from chord_progressions import logger
-from chord_progressions.evaluate import evaluate_notes
-from chord_progressions.io.audio import mk_chord_buffer, save_audio_buffer
-from chord_progressions.io.midi import get_midi_from_chord
+from chord_progressions.evaluate import (
+    PC_SET_METRICS,
+    evaluate_notes,
+    get_overtone_agreements,
+)
+from chord_progressions.io.audio import (
+    get_quality_settings,
+    mk_chord_buffer,
+    save_audio_buffer,
+)
+from chord_progressions.io.midi import (
+    get_midi_from_chord,
+    get_smf_bytes_from_chord,
+    save_midi_bytes,
+)
 from chord_progressions.pitch import get_midi_num_from_note, get_note_from_midi_num
+from chord_progressions.pitch_class_set import PitchClassSet
 from chord_progressions.type_templates import (
-    get_template_from_notes,
-    get_type_from_midi_nums,
-    get_type_num_from_type,
+    TYPE_NUMS_BY_MASK,
+    TYPE_TEMPLATES,
+    get_template_from_pitch_classes,
+    get_type_from_mask,
+    get_type_num_from_mask,
 )
 
 NoteList = list[str]
 MidiNumList = list[int]
 
+ID_TYPES = ["uuid", "counter", "content"]
+
+_chord_counter = itertools.count()
+
+
+def mk_chord_id(midi_nums: MidiNumList, id_type: str = "uuid"):
+    """Creates an id for a chord.
+
+    id_type
+        "uuid": a random uuid4, unique across processes
+        "counter": an incrementing integer, unique within the process
+        "content": a hash of the midi numbers, equal for chords with the same notes
+    """
+    if id_type == "uuid":
+        return str(uuid4())
+    if id_type == "counter":
+        return str(next(_chord_counter))
+    if id_type == "content":
+        return hashlib.blake2b(bytes(midi_nums), digest_size=8).hexdigest()
+
+    raise ValueError(f"id_type must be one of {ID_TYPES}")
+
+
+def analyze_midi_nums(midi_nums: tuple):
+    """Returns the (type, typeId, notes, template, metrics) of a sorted tuple of unique midi numbers"""
+    pcs = PitchClassSet.from_midi_nums(midi_nums)
+    notes = [get_note_from_midi_num(n) for n in midi_nums]
+
+    return (
+        get_type_from_mask(pcs),
+        get_type_num_from_mask(pcs),
+        notes,
+        get_template_from_pitch_classes(pcs),
+        evaluate_notes(notes),
+    )
+
+
+def freeze_metrics(metrics: dict):
+    """Returns a read-only view of `metrics`, with its lists as tuples"""
+    return MappingProxyType(
+        {k: tuple(v) if isinstance(v, list) else v for k, v in metrics.items()}
+    )
+
+
+def thaw_metrics(metrics):
+    """Returns a dict copy of `metrics`, with its tuples as lists"""
+    return {k: list(v) if isinstance(v, tuple) else v for k, v in metrics.items()}
+
+
+def analyze_midi_nums_frozen(midi_nums: tuple):
+    """Returns `analyze_midi_nums` with tuples of notes and templates and frozen metrics, safe to share"""
+    type_, type_id, notes, template, metrics = analyze_midi_nums(midi_nums)
+    return type_, type_id, tuple(notes), tuple(template), freeze_metrics(metrics)
+
+
+# When set, chords with equal midi numbers share the result of `analyze_midi_nums_frozen`
+_interned_analyze_midi_nums = None
+
+
+def enable_chord_interning(maxsize: int = 4096):
+    """Shares the analysis of chords with equal midi numbers through an LRU cache of `maxsize` voicings.
+
+    Interned chords have tuples of notes and templates, and read-only metrics.
+    """
+    global _interned_analyze_midi_nums
+    _interned_analyze_midi_nums = lru_cache(maxsize=maxsize)(analyze_midi_nums_frozen)
+
+
+def disable_chord_interning():
+    global _interned_analyze_midi_nums
+    _interned_analyze_midi_nums = None
+
+
+def get_chord_interning_info():
+    """Returns the hits, misses, maxsize and currsize of the interning cache, or None if disabled"""
+    if _interned_analyze_midi_nums is None:
+        return None
+    return _interned_analyze_midi_nums.cache_info()
+
 
 class Chord:
     """A set of unique notes.
 
+    Only `midi_nums` is computed up front. The type, notes, metrics, template and id are computed on first access,
+    unless chord interning is enabled, see `enable_chord_interning`.
+
     Parameters
     ----------
     notes: list[Chord], default []
         The set of notes in the chord. Can be specified as a list of midi numbers or as a list of note names.
             e.g. Chord([60, 64, 67])
             e.g. Chord(["C4", "E4", "G4"])
+    id: str, default None
+        The id of the chord. Created with `id_type` if not provided.
+    id_type: str, default "uuid"
+        How to create the id if none is provided, see `mk_chord_id`.
     """
 
-    def __init__(self, notes: list = [], id: str = None):
+    __slots__ = (
+        "midi_nums",
+        "_id",
+        "_id_type",
+        "_pcs",
+        "_type",
+        "_type_id",
+        "_notes",
+        "_metrics",
+        "_template",
+    )
+
+    def __init__(self, notes: list = [], id: str = None, id_type: str = "uuid"):
         if isinstance(notes, list) and len(notes) > 0 and isinstance(notes[0], str):
             notes = [get_midi_num_from_note(n) for n in notes]
 
-        self.init_from_midi_nums(midi_nums=notes, id=id)
+        self.init_from_midi_nums(midi_nums=notes, id=id, id_type=id_type)
+
+    def init_from_midi_nums(
+        self, midi_nums: MidiNumList = [], id: str = None, id_type: str = "uuid"
+    ):
+        if any([i < 0 or i > 127 for i in midi_nums]):
+            raise ValueError("The valid range of midi numbers is 0 to 127")
 
-    def init_from_midi_nums(self, midi_nums: MidiNumList = [], id: str = None):
-        if any([i < 0 or i > 128 for i in midi_nums]):
-            raise ValueError("The valid range of midi numbers is 0 to 128")
+        if id_type not in ID_TYPES:
+            raise ValueError(f"id_type must be one of {ID_TYPES}")
 
         midi_nums = sorted(list(set(midi_nums)))
         self.midi_nums = [int(i) for i in midi_nums]
 
-        chord_type = get_type_from_midi_nums(midi_nums)
-        self.type = chord_type
-        self.typeId = get_type_num_from_type(chord_type)
+        # counter ids follow creation order, other ids are created on first access
+        if not id and id_type == "counter":
+            id = mk_chord_id(self.midi_nums, id_type)
+
+        self._id = id or None
+        self._id_type = id_type
+
+        self._pcs = None
 
-        notes = [get_note_from_midi_num(n) for n in midi_nums]
-        self.notes = notes
-        self.metrics = evaluate_notes(notes)
-        self.template = get_template_from_notes(notes)
+        if _interned_analyze_midi_nums is not None:
+            (
+                self._type,
+                self._type_id,
+                self._notes,
+                self._template,
+                self._metrics,
+            ) = _interned_analyze_midi_nums(tuple(self.midi_nums))
+        else:
+            self._type = None
+            self._type_id = None
+            self._notes = None
+            self._metrics = None
+            self._template = None
+
+    @property
+    def id(self):
+        if self._id is None:
+            self._id = mk_chord_id(self.midi_nums, self._id_type)
+        return self._id
+
+    @id.setter
+    def id(self, id):
+        self._id = id
+
+    @property
+    def pitch_class_set(self):
+        if self._pcs is None:
+            self._pcs = PitchClassSet.from_midi_nums(self.midi_nums)
+        return self._pcs
+
+    @property
+    def type(self):
+        if self._type is None:
+            self._type = get_type_from_mask(self.pitch_class_set)
+        return self._type
+
+    @property
+    def typeId(self):
+        if self._type_id is None:
+            self._type_id = get_type_num_from_mask(self.pitch_class_set)
+        return self._type_id
 
-        if not id:
-            id = str(uuid4())
-        self.id = id
+    @property
+    def notes(self):
+        if self._notes is None:
+            self._notes = [get_note_from_midi_num(n) for n in self.midi_nums]
+        return self._notes
+
+    @property
+    def metrics(self):
+        if self._metrics is None:
+            self._metrics = evaluate_notes(self.notes)
+        return self._metrics
+
+    @property
+    def template(self):
+        if self._template is None:
+            self._template = get_template_from_pitch_classes(self.pitch_class_set)
+        return self._template
 
     def __repr__(self):
         return "Chord " + self.to_string()
@@ -64,21 +244,34 @@ class Chord:
             "midi_nums": self.midi_nums,
             "type": self.type,
             "typeId": self.typeId,
-            "notes": self.notes,
-            "metrics": self.metrics,
+            "notes": list(self.notes),
+            "metrics": thaw_metrics(self.metrics),
         }
 
-    def to_audio(self, outpath=None, n_overtones=4):
-        audio = mk_chord_buffer(self.notes, 1, n_overtones)
+    def to_audio(self, outpath=None, n_overtones=4, quality="high"):
+        """Renders one second of the chord, with `quality` one of the keys of `QUALITIES`"""
+        audio = mk_chord_buffer(self.notes, 1, n_overtones, quality=quality)
 
         if outpath:
-            save_audio_buffer(audio, outpath)
+            sample_rate = get_quality_settings(quality)["sample_rate"]
+            save_audio_buffer(audio, outpath, sample_rate)
             logger.info(f"Audio saved to {outpath}")
         else:
             return audio
 
-    def to_midi(self, outpath=None):
-        mid = get_midi_from_chord(self.chords, 1, 120, "-".join(self.notes))
+    def to_midi(self, outpath=None, backend="mido"):
+        """
+        Converts one second of the chord to a mido.MidiFile, or with the "bytes" backend,
+        encodes the same file directly to bytes. Saves it to `outpath` if passed.
+        """
+        name = "-".join(self.notes)
+
+        if backend == "bytes":
+            return save_midi_bytes(get_smf_bytes_from_chord(self, name), outpath)
+        elif backend != "mido":
+            raise ValueError(f"Unknown midi backend: {backend}")
+
+        mid = get_midi_from_chord(self, name)
 
         if outpath:
             mid.filename = outpath
@@ -86,3 +279,155 @@ class Chord:
             logger.info(f"Midi saved to {outpath}")
         else:
             return mid
+
+
+# type ids indexed by pitch class mask, with -1 where no template matches
+TYPE_NUMS_ARRAY = np.array([-1 if n is None else n for n in TYPE_NUMS_BY_MASK])
+
+TYPE_NAMES = list(TYPE_TEMPLATES)
+
+
+def get_padded_midi_nums(midi_nums, pad_value=-1):
+    """Converts a ragged midi_nums_list to a 2D array padded with `pad_value`, e.g.
+
+    [[60, 64], [48]] -> [[60, 64], [48, -1]]
+    """
+    if isinstance(midi_nums, np.ndarray):
+        if midi_nums.ndim != 2:
+            raise ValueError("Padded midi_nums must be a 2D array")
+        return midi_nums.astype(int)
+
+    lengths = np.array([len(row) for row in midi_nums], dtype=int)
+    width = lengths.max() if len(lengths) else 0
+
+    padded = np.full((len(lengths), width), pad_value, dtype=int)
+
+    row_ixs = np.repeat(np.arange(len(lengths)), lengths)
+    offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    col_ixs = np.arange(lengths.sum()) - offsets
+
+    padded[row_ixs, col_ixs] = [n for row in midi_nums for n in row]
+
+    return padded
+
+
+class ChordBatch:
+    """Many chords stored column-wise, analyzed in vectorized passes.
+
+    Produces the same per-chord output as `Chord` without creating a Python object per chord.
+
+    Parameters
+    ----------
+    midi_nums: list[list[int]] or np.ndarray
+        The midi numbers of each chord, either as a ragged midi_nums_list or as a 2D array padded with `pad_value`.
+            e.g. ChordBatch([[60, 64, 67], [48, 60]])
+            e.g. ChordBatch(np.array([[60, 64, 67], [48, 60, -1]]))
+    ids: list[str], default None
+        The id of each chord. Random ids are created on first use if not provided.
+    pad_value: int, default -1
+        The value that marks empty positions in padded input.
+    """
+
+    def __init__(self, midi_nums, ids: list = None, pad_value: int = -1):
+        padded = get_padded_midi_nums(midi_nums, pad_value)
+        if padded.shape[1] == 0:
+            padded = np.full((len(padded), 1), pad_value)
+
+        is_note = padded != pad_value
+        if ((padded < 0) | (padded > 127))[is_note].any():
+            raise ValueError("The valid range of midi numbers is 0 to 127")
+
+        # sort each row with padding last, then push repeated notes into the padding
+        empty = 128
+        rows = np.sort(np.where(is_note, padded, empty), axis=1)
+        rows[:, 1:][rows[:, 1:] == rows[:, :-1]] = empty
+        rows = np.sort(rows, axis=1)
+
+        num_notes = (rows != empty).sum(axis=1)
+        rows = rows[:, : max(num_notes.max(initial=0), 1)]
+        is_note = rows != empty
+
+        self.midi_nums = np.where(is_note, rows, -1)
+        self.num_notes = num_notes
+
+        pc_bits = np.where(is_note, 1 << (rows % 12), 0)
+        self.masks = np.bitwise_or.reduce(pc_bits, axis=1)
+        self.type_ids = TYPE_NUMS_ARRAY[self.masks]
+        self.templates = (self.masks[:, None] >> np.arange(12)) & 1
+
+        self.metrics = self.evaluate()
+
+        if ids is not None and len(ids) != len(self):
+            raise ValueError("ids must be the same length as midi_nums")
+        self._ids = ids
+
+    def evaluate(self):
+        """Computes the metrics of every chord, looking up the pitch class metrics by mask"""
+        pc_metrics = PC_SET_METRICS[self.masks]
+
+        lowest = self.midi_nums[:, 0]
+        highest = self.midi_nums[
+            np.arange(len(self)), np.maximum(self.num_notes - 1, 0)
+        ]
+
+        return {
+            "num_notes": self.num_notes,
+            "num_pitches": self.num_notes,
+            "pc_cardinality": pc_metrics["pc_cardinality"],
+            "interval_class_vector": pc_metrics["interval_class_vector"],
+            "ambitus": np.where(self.num_notes > 0, highest - lowest, 0),
+            "evenness": pc_metrics["evenness"],
+            "relative_evenness": pc_metrics["relative_evenness"],
+            "overtone_agreement": get_overtone_agreements(self.midi_nums),
+        }
+
+    def __len__(self):
+        return len(self.num_notes)
+
+    def __repr__(self):
+        return f"ChordBatch of {len(self)} chords"
+
+    @property
+    def ids(self):
+        if self._ids is None:
+            self._ids = [str(uuid4()) for _ in range(len(self))]
+        return self._ids
+
+    @property
+    def types(self):
+        return [TYPE_NAMES[i] if i >= 0 else "" for i in self.type_ids]
+
+    def get_midi_nums(self, ix):
+        return self.midi_nums[ix, : self.num_notes[ix]].tolist()
+
+    def row_to_json(self, ix):
+        """Returns the chord at `ix` in the same shape as `Chord.to_json`"""
+        midi_nums = self.get_midi_nums(ix)
+        type_id = int(self.type_ids[ix])
+        metrics = self.metrics
+
+        return {
+            "id": self.ids[ix],
+            "midi_nums": midi_nums,
+            "type": TYPE_NAMES[type_id] if type_id >= 0 else "",
+            "typeId": type_id if type_id >= 0 else None,
+            "notes": [get_note_from_midi_num(n) for n in midi_nums],
+            "metrics": {
+                "num_notes": int(metrics["num_notes"][ix]),
+                "num_pitches": int(metrics["num_pitches"][ix]),
+                "pc_cardinality": int(metrics["pc_cardinality"][ix]),
+                "interval_class_vector": metrics["interval_class_vector"][ix].tolist(),
+                "ambitus": int(metrics["ambitus"][ix]),
+                "evenness": float(metrics["evenness"][ix]),
+                "relative_evenness": float(metrics["relative_evenness"][ix]),
+                "overtone_agreement": float(metrics["overtone_agreement"][ix]),
+            },
+        }
+
+    def to_json(self):
+        return [self.row_to_json(ix) for ix in range(len(self))]
+
+    def to_chords(self):
+        return [
+            Chord(self.get_midi_nums(ix), id=self.ids[ix]) for ix in range(len(self))
+        ]
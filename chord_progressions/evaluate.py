@@ -9,16 +9,18 @@
         - something like https://en.xen.wiki/w/Harmonic_Entropy
 """
 
-import itertools
-
 import numpy as np
 from chord_progressions.pitch import (
     get_freq_from_note,
+    get_freqs_from_midi_nums,
     get_midi_num_from_note,
     get_n_overtones_harmonic,
-    get_pitch_class_from_note,
 )
-from chord_progressions.type_templates import get_template_from_notes
+from chord_progressions.pitch_class_set import (
+    PitchClassSet,
+    get_mask_cardinality,
+    rotate_mask,
+)
 
 
 def get_interval_class_vector(notes):
@@ -30,21 +32,31 @@ def get_interval_class_vector(notes):
         3: major third / minor sixth (4 or 8 semitones)
         4: perfect fourth / perfect fifth (5 or 7 semitones)
         5: tritone (6 semitones)
+
+    `notes` can be a list of notes or a PitchClassSet.
     """
+    if isinstance(notes, PitchClassSet):
+        pcs = notes
+    else:
+        pcs = PitchClassSet.from_notes(notes)
+
     vec = [0] * 6
 
-    template = get_template_from_notes(notes)
-    one_indices = [ix for ix, i in enumerate(template) if i == 1]
-    pairs = list(itertools.combinations(one_indices, 2))
+    # bit `pc` of `mask & rotate_mask(mask, -i)` is set when both `pc` and `pc + i` are present
+    for i in range(1, 7):
+        vec[i - 1] = get_mask_cardinality(pcs.mask & rotate_mask(pcs.mask, -i))
+
+    # the tritone pairs are counted from both of their pitch classes
+    vec[5] //= 2
 
-    intervals = [p[1] - p[0] for p in pairs]
+    return vec
 
-    modded = [12 - i if i > 6 else i for i in intervals]
 
-    for i in range(6):
-        vec[i] = modded.count(i + 1)
+# The weight of each interval class in `get_evenness`, i.e. the chord length between its pitch classes
+EVENNESS_WEIGHT_VECTOR = 2 * np.sin(np.arange(1, 7) * np.pi / 12)
 
-    return vec
+# Column `i` of row `k - 1` is the pitch class `k` semitones above `i`
+INTERVAL_INDICES = (np.arange(12) + np.arange(1, 7)[:, None]) % 12
 
 
 def get_evenness(interval_class_vector):
@@ -53,64 +65,106 @@ def get_evenness(interval_class_vector):
     Note that acoustic consonance implies near-evenness, but not the reverse.
     For background on the equation see https://www.researchgate.net/profile/Jack_Douthett/publication/249881698_Vector_Products_and_Intervallic_Weighting/links/575061d708ae1c34b39aaa1b.pdf
     """
-    weight_vector = [0] * 6
+    return np.dot(EVENNESS_WEIGHT_VECTOR, interval_class_vector)
+
 
-    for i in range(6):
+def get_templates_from_masks(masks):
+    """Converts an array of N pitch class masks to an (N, 12) template matrix"""
+    return (np.asarray(masks, dtype=int)[:, None] >> np.arange(12)) & 1
 
-        k = i + 1
 
-        weight_vector[i] += 2 * np.sin(k * np.pi / 12)
+def get_interval_class_vectors(templates):
+    """
+    Computes the interval class vectors of many pitch class sets at once.
+    `templates` is an (N, 12) template matrix or an array of N pitch class masks.
+    Returns an (N, 6) array, see `get_interval_class_vector`.
+    """
+    templates = np.asarray(templates, dtype=int)
+    if templates.ndim == 1:
+        templates = get_templates_from_masks(templates)
 
-    weight = np.dot(weight_vector, interval_class_vector)
+    # count the pitch classes that have another pitch class `k` semitones above them
+    vecs = (templates[:, None, :] * templates[:, INTERVAL_INDICES]).sum(axis=2)
 
-    return weight
+    # the tritone pairs are counted from both of their pitch classes
+    vecs[:, 5] //= 2
+
+    return vecs
+
+
+def get_evenness_values(interval_class_vectors):
+    """Computes `get_evenness` for an (N, 6) array of interval class vectors"""
+    return np.asarray(interval_class_vectors) @ EVENNESS_WEIGHT_VECTOR
+
+
+def get_min_evenness(cardinality):
+    """The lowest evenness of any pitch class set with `cardinality` pitch classes, reached by a chromatic cluster"""
+    cluster = PitchClassSet(range(cardinality))
+    return get_evenness(get_interval_class_vector(cluster))
+
+
+def get_max_evenness(cardinality):
+    """The highest evenness of any pitch class set with `cardinality` pitch classes, reached by a maximally even set.
+    See Clough & Douthett, "Maximally Even Sets", Journal of Music Theory, Vol. 35 (1991)
+    """
+    maximally_even = PitchClassSet([12 * i // cardinality for i in range(cardinality)])
+    return get_evenness(get_interval_class_vector(maximally_even))
 
 
 def get_relative_evenness(evenness, cardinality):
     """
     Calculate the evenness of a pitch class set relative to its possible range.
     A relative value is useful because highly-even dyads will have a lower evenness than highly uneven hexachords.
-    The result is a value between 0 and 1.
+    The result is a value between 0 and 1. Cardinalities with a single possible evenness (0, 1, 11 and 12) score 1.
+    Accepts scalars or arrays.
     """
-    # TODO: replace this table with a formula
-    MIN_MAX_EVENNESS_BY_CARDINALITY = [
-        [0.0, 0.0],
-        [0.5176380902050415, 2.0],
-        [2.035276180410083, 5.196152422706632],
-        [6.1815405503520555, 9.65685424949238],
-        [9.631030293135233, 15.287884542627612],
-        [16.226784405860382, 22.392304845413264],
-        [24.822538518585535, 30.479392768077915],
-        [35.350144283888824, 40.03987070039298],
-        [47.609800856760984, 50.77067709905754],
-        [61.28367099200624, 62.7660329018012],
-        [75.9575411272515, 75.9575411272515],
-        [91.14904935270181, 91.14904935270181],
-    ]
-
-    emin, emax = MIN_MAX_EVENNESS_BY_CARDINALITY[cardinality - 1]
-    return (evenness - emin) / (emax - emin)
-
-
-def get_overtone_agreement(notes):
+    emin, emax = EVENNESS_RANGE_BY_CARDINALITY[cardinality].T
+    erange = emax - emin
 
-    freqs = [get_freq_from_note(n) for n in notes]
+    has_range = erange > EVENNESS_TOLERANCE
+    relative = np.where(
+        has_range, (evenness - emin) / np.where(has_range, erange, 1), 1.0
+    )
 
-    all_partials = []
+    return relative if relative.ndim else float(relative)
 
-    n_overtones = 10
-    for f in freqs:
-        all_partials.extend(get_n_overtones_harmonic(f, n_overtones))
 
-    sorted_partials = sorted(all_partials)
+def get_overtone_agreements(midi_nums, n_overtones=10):
+    """
+    Computes `get_overtone_agreement` for an (N, W) array of midi numbers padded with -1.
+    The partials of each note are its first `n_overtones` + 1 harmonics, as in `get_n_overtones_harmonic`.
+    """
+    if len(midi_nums) == 0:
+        return np.zeros(0)
+
+    midi_nums = np.asarray(midi_nums, dtype=int).reshape(len(midi_nums), -1)
+
+    is_note = midi_nums >= 0
+    freqs = get_freqs_from_midi_nums(np.where(is_note, midi_nums, 0))
+
+    # the differences between sorted partials telescope to the highest partial minus the lowest
+    highest = np.where(is_note, freqs, 0).max(axis=1, initial=0) * (n_overtones + 1)
+    lowest = np.where(is_note, freqs, np.inf).min(axis=1, initial=np.inf)
 
-    sum_of_differences = 0
+    return np.where(is_note.any(axis=1), highest - lowest, 0.0)
 
-    for i in range(1, len(sorted_partials)):
-        diff = sorted_partials[i] - sorted_partials[i - 1]
-        sum_of_differences += diff
 
-    return sum_of_differences
+def get_overtone_agreement(notes, n_overtones=10):
+    """The sum of the differences between the sorted partials of all notes"""
+    midi_nums = [get_midi_num_from_note(n) for n in notes]
+    return float(get_overtone_agreements([midi_nums], n_overtones)[0])
+
+
+def evaluate_pitch_class_set(pcs):
+    """Returns the metrics that depend only on the pitch classes of a chord, e.g. PitchClassSet([0, 4, 7])"""
+    row = PC_SET_METRICS[pcs]
+
+    return {
+        "pc_cardinality": int(row["pc_cardinality"]),
+        "interval_class_vector": row["interval_class_vector"].tolist(),
+        "evenness": row["evenness"],
+        "relative_evenness": row["relative_evenness"],
+    }
 
 
 def evaluate_notes(notes):
@@ -120,21 +174,16 @@ def evaluate_notes(notes):
 
     try:
 
-        interval_class_vector = get_interval_class_vector(notes)
-
-        evenness = get_evenness(interval_class_vector)
-
-        pc_cardinality = len(set([get_pitch_class_from_note(n) for n in notes]))
-        assert pc_cardinality <= 12, "Pitch class cardinality > 12"
+        pc_metrics = evaluate_pitch_class_set(PitchClassSet.from_notes(notes))
 
         metrics["num_notes"] = len(notes)
         metrics["num_pitches"] = len(set(notes))
-        metrics["pc_cardinality"] = pc_cardinality
-        metrics["interval_class_vector"] = interval_class_vector
+        metrics["pc_cardinality"] = pc_metrics["pc_cardinality"]
+        metrics["interval_class_vector"] = pc_metrics["interval_class_vector"]
         metrics["ambitus"] = get_ambitus(notes)
-        metrics["evenness"] = evenness
-        # metrics["relative_evenness"] = get_relative_evenness(evenness, pc_cardinality)
-        # metrics["overtone_agreement"] = get_overtone_agreement(notes)
+        metrics["evenness"] = pc_metrics["evenness"]
+        metrics["relative_evenness"] = pc_metrics["relative_evenness"]
+        metrics["overtone_agreement"] = get_overtone_agreement(notes)
 
     except:
         pass
@@ -185,3 +234,38 @@ def get_n_overtones_for_notes(notes, n):
     o_freqs = [get_n_overtones_harmonic(f, n) for f in freqs]
 
     return o_freqs
+
+
+def _build_pc_set_metrics():
+    """Computes the pitch class metrics of each of the 4096 pitch class sets, indexed by mask"""
+    masks = np.arange(4096)
+    interval_class_vectors = get_interval_class_vectors(masks)
+
+    dtype = np.dtype(
+        [
+            ("pc_cardinality", np.uint8),
+            ("interval_class_vector", np.uint8, (6,)),
+            ("evenness", float),
+            ("relative_evenness", float),
+        ]
+    )
+    metrics = np.zeros(len(masks), dtype=dtype)
+
+    metrics["pc_cardinality"] = get_templates_from_masks(masks).sum(axis=1)
+    metrics["interval_class_vector"] = interval_class_vectors
+    metrics["evenness"] = [get_evenness(icv) for icv in interval_class_vectors]
+    metrics["relative_evenness"] = get_relative_evenness(
+        metrics["evenness"], metrics["pc_cardinality"]
+    )
+
+    return metrics
+
+
+# The (min, max) evenness of each cardinality from 0 to 12, see `get_relative_evenness`
+EVENNESS_RANGE_BY_CARDINALITY = np.array(
+    [[get_min_evenness(k), get_max_evenness(k)] for k in range(13)]
+)
+EVENNESS_TOLERANCE = 1e-9
+
+# Computed once at import, see `evaluate_pitch_class_set`
+PC_SET_METRICS = _build_pc_set_metrics()
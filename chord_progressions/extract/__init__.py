@@ -1 +1,2 @@
 from chord_progressions.extract.midi_harman import extract_progression_from_midi
+from chord_progressions.extract.pipeline import ExtractionPipeline
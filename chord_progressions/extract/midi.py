@@ -1,11 +1,10 @@
 """Process polyphonic midi to make it more well-suited for chord extraction"""
 
-from functools import partial
 
 import numpy as np
-import pandas as pd
 import pretty_midi
-from chord_progressions.io.midi import load_midi_file
+from chord_progressions.io.midi import load_midi_notes
+from chord_progressions.midi import unwarp_seconds_from_bpm, warp_seconds_to_bpm
 
 # note values, e.g. 1/4 = quarter note, 1/64 = 64th note
 DEFAULT_SHORTEST_NOTE = 1 / 64
@@ -47,6 +46,19 @@ def parse_notes(pmid):
     return np.sort(notes, order="start")
 
 
+def parse_note_array(midi_notes):
+    """Parses notes from `load_midi_notes` into the same (start, end, note) array as `parse_notes`."""
+    midi_notes = midi_notes[~midi_notes["is_drum"]]
+
+    dtype = np.dtype([("start", float), ("end", float), ("note", int)])
+    notes = np.zeros(len(midi_notes), dtype=dtype)
+    notes["start"] = midi_notes["start"]
+    notes["end"] = midi_notes["end"]
+    notes["note"] = midi_notes["pitch"]
+
+    return np.sort(notes, order="start")
+
+
 def round_to_target(target, x):
     """Round `x` to the closest `target`
 
@@ -64,51 +76,61 @@ def quantize_times(times, beat):
 
     e.g. quantize_times([1.1, 1.2, 1.3, 1.4], 0.5) == [1., 1., 1.5, 1.5]
     """
-    func = partial(round_to_target, beat)
-
-    return list(map(func, times))
+    # same as `round_to_target` for each time, since both round half to even
+    y = 1 / beat
+    return np.round(np.asarray(times, dtype=float) * y) / y
 
 
 def drop_short_notes(notes, shortest_duration):
     """Removes notes that are shorter than shortest_duration"""
 
-    short_note_ixs = []
-
-    for ix, n in enumerate(notes):
-        if n["end"] - n["start"] < shortest_duration:
-            short_note_ixs.append(ix)
-
-    return np.delete(notes, short_note_ixs)
+    return notes[~(notes["end"] - notes["start"] < shortest_duration)]
 
 
 def smooth_notes(notes, step_size):
-    """Joins adjacent, repeated notes into single, longer notes"""
-
-    df = pd.DataFrame(notes)
+    """Joins adjacent, repeated notes into single, longer notes
 
-    steps = np.arange(df.start.min(), df.end.max() + step_size, step_size)
+    Notes that start and end within the same step are grouped by pitch. The first note of each group
+    is extended to the end of the last one, and the rest of the group is dropped.
+    """
 
-    for ix, s in enumerate(steps):
-        if ix == 0:
-            continue
+    dtype = np.dtype([("start", float), ("end", float), ("note", int)])
+    smoothed = np.zeros(len(notes), dtype=dtype)
+    smoothed["start"] = notes["start"]
+    smoothed["end"] = notes["end"]
+    smoothed["note"] = notes["note"]
 
-        seg = df[(df["start"] >= steps[ix - 1]) & (df["end"] < s)]
+    if len(notes) == 0:
+        return smoothed
 
-        vcs = seg.note.value_counts()
-        vcs1 = vcs[vcs > 1]
+    steps = np.arange(
+        smoothed["start"].min(), smoothed["end"].max() + step_size, step_size
+    )
 
-        for k, v in vcs1.items():
-            svc = seg[seg.note == k]
+    # the step each note starts in, and whether it also ends in that step
+    step_ixs = np.searchsorted(steps, smoothed["start"], side="right")
+    in_step = step_ixs < len(steps)
+    in_step[in_step] = smoothed["end"][in_step] < steps[step_ixs[in_step]]
 
-            df.loc[svc.index[0], "end"] = seg.loc[svc.index[-1]]["end"]
+    # group the notes by (step, pitch), in their original order within each group
+    ixs = np.flatnonzero(in_step)
+    order = np.lexsort((ixs, smoothed["note"][ixs], step_ixs[ixs]))
+    grouped_ixs = ixs[order]
 
-            df.drop(index=svc.index[1:], inplace=True)
+    grouped_steps = step_ixs[grouped_ixs]
+    grouped_pitches = smoothed["note"][grouped_ixs]
+    is_first = np.ones(len(grouped_ixs), dtype=bool)
+    is_first[1:] = (grouped_steps[1:] != grouped_steps[:-1]) | (
+        grouped_pitches[1:] != grouped_pitches[:-1]
+    )
+    is_last = np.roll(is_first, -1)
 
-    tups = list(df.itertuples(index=False, name=None))
+    smoothed["end"][grouped_ixs[is_first]] = smoothed["end"][grouped_ixs[is_last]]
 
-    dtype = np.dtype([("start", float), ("end", float), ("note", int)])
+    keep = np.ones(len(smoothed), dtype=bool)
+    keep[grouped_ixs[~is_first]] = False
 
-    return np.array(tups, dtype=dtype)
+    return smoothed[keep]
 
 
 def mk_midi_from_notes(notes):
@@ -132,9 +154,16 @@ def simplify_harmony_from_file(
     shortest_note=DEFAULT_SHORTEST_NOTE,
     smooth_beat=DEFAULT_SMOOTH_BEAT,
     quantize_beat=DEFAULT_QUANTIZE_BEAT,
+    cache=None,
 ):
-    midi = load_midi_file(filepath)
-    return simplify_harmony(midi, shortest_note, smooth_beat, quantize_beat)
+    midi_notes, tempos = load_midi_notes(filepath, cache=cache)
+    notes = parse_note_array(midi_notes)
+
+    return mk_midi_from_notes(
+        simplify_harmony_from_notes(
+            notes, tempos, shortest_note, smooth_beat, quantize_beat
+        )
+    )
 
 
 def simplify_harmony(
@@ -149,19 +178,38 @@ def simplify_harmony(
 
     tempos = midi.get_tempo_changes()
 
-    # TODO: handle tempo changes
+    return mk_midi_from_notes(
+        simplify_harmony_from_notes(
+            notes, tempos, shortest_note, smooth_beat, quantize_beat
+        )
+    )
+
+
+def simplify_harmony_from_notes(
+    notes,
+    tempos,
+    shortest_note=DEFAULT_SHORTEST_NOTE,
+    smooth_beat=DEFAULT_SMOOTH_BEAT,
+    quantize_beat=DEFAULT_QUANTIZE_BEAT,
+):
+    """
+    Simplify a (start, end, note) array to its essential harmonic content,
+    given the tempo changes in the shape of `PrettyMIDI.get_tempo_changes()`.
+    Notes are processed as if the whole file had its first tempo, so note values are the same
+    across tempo changes.
+    """
+
     if len(tempos[0]) == 0:
         raise ValueError("No tempos")
-    if len(tempos[0]) > 1:
-        #     raise ValueError("Can't handle tempo changes")
-        print(
-            "Warning: MIDI file has tempo changes but a constant BPM is assumed when processing"
-        )
 
     # TODO: calculate note durations based on time signature
     bpm = tempos[1][0]
     whole_note_dur = 60 / bpm * 4  # seconds
 
+    notes = notes.copy()
+    notes["start"] = warp_seconds_to_bpm(notes["start"], tempos, bpm)
+    notes["end"] = warp_seconds_to_bpm(notes["end"], tempos, bpm)
+
     # convert durations to seconds
     shortest_dur = whole_note_dur * shortest_note
     smooth_dur = whole_note_dur * smooth_beat
@@ -179,8 +227,12 @@ def simplify_harmony(
     notes_cleaned_2["end"] = quantize_times(notes_cleaned_2["end"], quantize_dur)
 
     # If start and end were quantized to the same time, move the end time back
-    for note in notes_cleaned_2:
-        if note["start"] == note["end"]:
-            note["end"] += quantize_dur
+    same = notes_cleaned_2["start"] == notes_cleaned_2["end"]
+    notes_cleaned_2["end"][same] += quantize_dur
+
+    notes_cleaned_2["start"] = unwarp_seconds_from_bpm(
+        notes_cleaned_2["start"], tempos, bpm
+    )
+    notes_cleaned_2["end"] = unwarp_seconds_from_bpm(notes_cleaned_2["end"], tempos, bpm)
 
-    return mk_midi_from_notes(notes_cleaned_2)
+    return notes_cleaned_2
@@ -7,7 +7,7 @@ https://interactiveaudiolab.github.io/assets/papers/pardo-birmingham-cmj02.pdf
 
 import os
 import time
-from collections import Counter, defaultdict
+from collections import defaultdict
 from copy import deepcopy
 
 import networkx as nx
@@ -20,19 +20,20 @@ from chord_progressions.extract.midi import (
     DEFAULT_SHORTEST_NOTE,
     DEFAULT_SMOOTH_BEAT,
 )
-from chord_progressions.extract.midi import simplify_harmony
-from chord_progressions.io.midi import load_midi_file
+from chord_progressions.extract.midi import (
+    mk_midi_from_notes,
+    parse_note_array,
+    simplify_harmony_from_notes,
+)
+from chord_progressions.io.midi import load_midi_notes
+from chord_progressions.midi import warp_seconds_to_bpm
 from chord_progressions.pitch import (
     get_note_from_midi_num,
     get_pitch_class_from_midi_num,
 )
+from chord_progressions.pitch_class_set import PitchClassSet
 from chord_progressions.progression import Progression
-from chord_progressions.type_templates import (
-    TYPE_TEMPLATES,
-    get_template_from_template_str,
-    get_type_num_from_type,
-)
-from chord_progressions.utils import shift_arr_by_one
+from chord_progressions.type_templates import TYPE_TEMPLATES, get_type_num_from_type
 
 # We pre-calculate all the templates we want to use as labels
 # TEMPLATE_LABELS will be {chord_type_id: (rotations, one_indices)}
@@ -46,36 +47,33 @@ def get_template_str(template):
 
 
 def get_all_rotations_of_template(template):
-    rotation_strs = set()
-    rotation_strs.add(get_template_str(template))
-
-    prev = template
-
-    for i in range(len(template) - 1):
-        rotated = shift_arr_by_one(prev)
-        rotation_strs.add(get_template_str(rotated))
-
-        prev = rotated
-
-    return [[int(j) for j in list(i)] for i in rotation_strs]
+    pcs = PitchClassSet.from_template(template)
+    return [r.template for r in pcs.get_rotations()]
 
 
 for template_name, template_str in TYPE_TEMPLATES.items():
 
     template_id = get_type_num_from_type(template_name)
-    template = get_template_from_template_str(template_str)
-
-    if sum(template) >= MIN_NUM_NOTES and sum(template) <= MAX_NUM_NOTES:
-        if template_id not in TEMPLATE_LABELS:
-            TEMPLATE_LABELS[template_id] = []
+    template_pcs = PitchClassSet.from_template_str(template_str)
 
-        rotations = get_all_rotations_of_template(template)
+    if MIN_NUM_NOTES <= template_pcs.cardinality <= MAX_NUM_NOTES:
+        rotations = template_pcs.get_rotations()
 
-        one_indices = []
-        for rotation in rotations:
-            one_indices.append([ix for ix, i in enumerate(rotation) if i == 1])
+        TEMPLATE_LABELS[template_id] = (
+            [r.template for r in rotations],
+            [list(r) for r in rotations],
+        )
 
-        TEMPLATE_LABELS[template_id] = (rotations, one_indices)
+# TEMPLATE_ROTATIONS is a (templates, rotations, 12) matrix of the rotations of each template in TEMPLATE_LABELS,
+# in the order of TEMPLATE_IDS. Templates with fewer distinct rotations repeat their first one.
+TEMPLATE_IDS = list(TEMPLATE_LABELS)
+MAX_NUM_ROTATIONS = max(len(rotations) for rotations, _ in TEMPLATE_LABELS.values())
+TEMPLATE_ROTATIONS = np.array(
+    [
+        rotations + rotations[:1] * (MAX_NUM_ROTATIONS - len(rotations))
+        for rotations, _ in TEMPLATE_LABELS.values()
+    ]
+)
 
 
 class PartitionPoint:
@@ -123,6 +121,10 @@ class MinimalSegment:
         pcs = self.get_pitch_classes()
         return {pc: pcs.count(pc) for pc in pcs}
 
+    def get_pitch_class_vector(self):
+        """The pitch class weights as a vector of 12 counts"""
+        return np.bincount(np.asarray(self.midi_nums, dtype=int) % 12, minlength=12)
+
     def get_template_scores(self):
         pcs = self.get_pitch_classes()
         pc_weights = {pc: pcs.count(pc) for pc in pcs}
@@ -161,6 +163,20 @@ def parse_events(pmid):
     return np.sort(events, order="time")
 
 
+def get_events_from_notes(notes):
+    """Converts a (start, end, note) array into the same events as `parse_events`."""
+    dtype = np.dtype([("time", float), ("note", int), ("is_onset", bool)])
+    events = np.zeros(2 * len(notes), dtype=dtype)
+
+    events["time"][::2] = notes["start"]
+    events["time"][1::2] = notes["end"]
+    events["note"][::2] = notes["note"]
+    events["note"][1::2] = notes["note"]
+    events["is_onset"][::2] = True
+
+    return np.sort(events, order="time")
+
+
 def get_partition_points(events):
     """Returns the partition points for a set of events, ordered by time."""
 
@@ -241,31 +257,48 @@ def get_template_score(pc_weights, template, oix):
     return P - (M + N)
 
 
-def get_template_scores(pc_weights):
-    """Scores a weighted set of pitch classes against all template labels.
+def get_pc_weight_vector(pc_weights):
+    """e.g. {0: 2, 4: 1, 7: 1} -> [2, 0, 0, 0, 1, 0, 0, 1, 0, 0, 0, 0]"""
+    weights = np.zeros(12, dtype=int)
 
-    Returns a dict of {label: score}
+    for pc, weight in pc_weights.items():
+        weights[pc] = weight
+
+    return weights
+
+
+def get_template_score_matrix(weights):
+    """Scores pitch class weight vectors against all template labels at once.
+
+    Gives the same scores as the best of `get_template_score` over the rotations of each template,
+    since P - (M + N) == 2P - M - (P + N), where P + N is the total weight.
+
+    Input:
+        weights, a (12,) vector or a (segments, 12) matrix of pitch class weights
+
+    Returns:
+        scores, the best score of each template in TEMPLATE_IDS, shaped (templates,) or (segments, templates)
     """
-    scores = {}
+    weights = np.asarray(weights)
 
-    for template_name, (rotations, one_indices) in TEMPLATE_LABELS.items():
+    # a pitch class adds 2 * weight to P - N when it's in the template, or counts as a miss when it's absent
+    evidence = 2 * weights - (weights == 0)
 
-        rotation_scores = []
+    scores = evidence @ TEMPLATE_ROTATIONS.reshape(-1, 12).T
+    scores = scores.reshape(*weights.shape[:-1], *TEMPLATE_ROTATIONS.shape[:2])
 
-        for ix, rotation in enumerate(rotations):
-            score = get_template_score(pc_weights, rotation, one_indices[ix])
+    # TODO: use dim7 resolution as tiebreaker (see Fig 4 in Pardo 2002)
+    return scores.max(axis=-1) - weights.sum(axis=-1, keepdims=True)
 
-            rotation_scores.append(score)
 
-        # TODO: use dim7 resolution as tiebreaker (see Fig 4 in Pardo 2002)
-        best_rotation_score = max(rotation_scores)
+def get_template_scores(pc_weights):
+    """Scores a weighted set of pitch classes against all template labels.
 
-        if template_name not in scores:
-            scores[template_name] = best_rotation_score
-        else:
-            scores[template_name] += best_rotation_score
+    Returns a dict of {label: score}
+    """
+    scores = get_template_score_matrix(get_pc_weight_vector(pc_weights))
 
-    return scores
+    return dict(zip(TEMPLATE_IDS, scores.tolist()))
 
 
 def get_minimal_segments(p_all):
@@ -315,18 +348,14 @@ def get_segment_label(segment):
     if not len(segment) > 0:
         raise ValueError("Empty segment")
 
-    counter = Counter(segment[0].get_template_scores())
-
-    for ms in segment[1:]:
-        counter.update(Counter(ms.get_template_scores()))
-
-    if not len(counter) > 0:
-        raise ValueError("No scores for segment")
+    weights = np.array([ms.get_pitch_class_vector() for ms in segment])
+    scores = get_template_score_matrix(weights).sum(axis=0)
 
     # TODO: it's common for multiple templates to have the same score. How should we tiebreak?
-    best_template, best_score = counter.most_common(1)[0]
+    # For now, the first template in TEMPLATE_IDS with the best score wins
+    best_ix = scores.argmax()
 
-    return best_score, best_template
+    return scores[best_ix].item(), TEMPLATE_IDS[best_ix]
 
 
 def get_segment_midi_nums(segment):
@@ -340,6 +369,31 @@ def get_segment_midi_nums(segment):
     return midi_nums
 
 
+def get_cumulative_template_scores(s_m):
+    """Returns a (minimal segments + 1, templates) array whose row `i` sums the template scores of `s_m[:i]`,
+    so that the scores of any segment `s_m[start:end]` are `cumulative[end] - cumulative[start]`.
+    """
+    weights = np.array([ms.get_pitch_class_vector() for ms in s_m]).reshape(-1, 12)
+    scores = get_template_score_matrix(weights)
+
+    cumulative = np.zeros((len(s_m) + 1, len(TEMPLATE_IDS)), dtype=scores.dtype)
+    np.cumsum(scores, axis=0, out=cumulative[1:])
+
+    return cumulative
+
+
+def get_span_label(cumulative_scores, start, end):
+    """The same as `get_segment_label(s_m[start:end])`, from the output of `get_cumulative_template_scores(s_m)`"""
+
+    if not end > start:
+        raise ValueError("Empty segment")
+
+    scores = cumulative_scores[end] - cumulative_scores[start]
+    best_ix = scores.argmax()
+
+    return scores[best_ix].item(), TEMPLATE_IDS[best_ix]
+
+
 def segment_and_label(p_all, s_m):
     """
     Based on the HarmAn algorithm by Pardo & Birmingham:
@@ -359,7 +413,13 @@ def segment_and_label(p_all, s_m):
 
     final_ix = len(p_all) - 1
 
+    # any segment s_m[start:end] is scored from the difference of two rows,
+    # and has notes if the number of notes in the minimal segments grows between them
+    cumulative_scores = get_cumulative_template_scores(s_m)
+    cumulative_num_notes = np.cumsum([0] + [len(ms.midi_nums) for ms in s_m])
+
     ui = 0  # index of the preceding vertex
+    uv_segment = None  # the bounds of the last preceding segment
 
     for vi, p in enumerate(p_all):
 
@@ -367,26 +427,27 @@ def segment_and_label(p_all, s_m):
             G.add_node(vi, marked=1, time=p.time)
             continue
 
-        uv_segment = s_m[ui:vi]  # preceding segment
-        uv_midi_nums = get_segment_midi_nums(uv_segment)
-        uv_notes = [get_note_from_midi_num(n) for n in uv_midi_nums]
+        uv_segment = (ui, vi)  # preceding segment
 
         # a minimal segment without notes is a rest for all instruments
-        if len(uv_midi_nums) == 0:
+        if cumulative_num_notes[vi] == cumulative_num_notes[ui]:
             logger.debug(f"  {vi}/{final_ix} - Continue: No notes in segment")
             continue
 
-        uv_score, uv_label = get_segment_label(uv_segment)
+        uv_score, uv_label = get_span_label(cumulative_scores, ui, vi)
 
         wi = vi + 1  # index of the succeeding vertex
-        vw_score, vw_label = get_segment_label(s_m[vi:wi])  # succeeding segment
-        uw_score, uw_label = get_segment_label(s_m[ui:wi])  # full segment
+        vw_score, vw_label = get_span_label(cumulative_scores, vi, wi)  # succeeding
+        uw_score, uw_label = get_span_label(cumulative_scores, ui, wi)  # full segment
 
         if uw_score < (uv_score + vw_score):
             logger.debug(
                 f"  {vi}/{final_ix} - New: {uw_label} ({uw_score}) < {uv_label} ({uv_score}) + {vw_label} ({vw_score})"
             )
 
+            uv_midi_nums = get_segment_midi_nums(s_m[ui:vi])
+            uv_notes = [get_note_from_midi_num(n) for n in uv_midi_nums]
+
             edge_attributes = {
                 "start_segment": ui,
                 "end_segment": vi,
@@ -405,11 +466,12 @@ def segment_and_label(p_all, s_m):
                 f"  {vi}/{final_ix} - Continue: {uw_label} ({uw_score}) >= {uv_label} ({uv_score}) + {vw_label} ({vw_score})"
             )
 
-    final_segment = s_m[ui:final_ix]
-    final_segment_midi_nums = get_segment_midi_nums(uv_segment)
+    # the final segment takes the midi nums of the last preceding segment, or its own if there was none
+    start, end = uv_segment or (ui, final_ix)
+    final_segment_midi_nums = get_segment_midi_nums(s_m[start:end])
     final_segment_notes = [get_note_from_midi_num(n) for n in final_segment_midi_nums]
 
-    final_score, final_label = get_segment_label(final_segment)
+    final_score, final_label = get_span_label(cumulative_scores, ui, final_ix)
 
     final_edge_attributes = {
         "start_segment": ui,
@@ -455,8 +517,15 @@ def segment_and_label(p_all, s_m):
 
 
 def label_midi(midi):
-    events = parse_events(midi)
+    return label_events(parse_events(midi))
 
+
+def label_notes(notes):
+    """Labels a (start, end, note) array, e.g. from `simplify_harmony_from_notes`"""
+    return label_events(get_events_from_notes(notes))
+
+
+def label_events(events):
     p_all = get_partition_points(events)
 
     s_m = get_minimal_segments(p_all)
@@ -464,15 +533,16 @@ def label_midi(midi):
     return segment_and_label(p_all, s_m)
 
 
-def label_file(filepath):
+def label_file(filepath, cache=None):
     logger.debug(f"Labeling {filepath}")
 
-    midi = load_midi_file(filepath)
-
-    if not midi:
+    try:
+        midi_notes, _ = load_midi_notes(filepath, cache=cache)
+    except Exception as e:
+        logger.error(f"Failed loading file {filepath}: {e}")
         return None
 
-    return label_midi(midi)
+    return label_notes(parse_note_array(midi_notes))
 
 
 def write_labels(labels, inpath, outpath, arrangement_id=None):
@@ -495,6 +565,23 @@ def write_labels(labels, inpath, outpath, arrangement_id=None):
     return {inpath: labels}
 
 
+def get_progression_from_labels(labels, tempos, name):
+    """Makes a progression of the chords in `labels`, at the first bpm of `tempos`"""
+    chords = [i["chord"] for i in labels]
+
+    bpms = [i[0] for i in tempos if i[0] > 0]
+
+    # progressions have a single bpm, so durations are measured as if the file had that bpm throughout
+    start_times = [i["start_time"] for i in labels]
+    end_times = [i["end_time"] for i in labels]
+    durations = (
+        warp_seconds_to_bpm(end_times, tempos, bpms[0])
+        - warp_seconds_to_bpm(start_times, tempos, bpms[0])
+    ).tolist()
+
+    return Progression(chords, durations, bpm=bpms[0], name=name)
+
+
 def extract_progression_from_midi(
     filepath,
     shortest_note=DEFAULT_SHORTEST_NOTE,
@@ -502,6 +589,7 @@ def extract_progression_from_midi(
     quantize_beat=DEFAULT_QUANTIZE_BEAT,
     simplified_path=None,
     harman_labels_path=None,
+    cache=None,
 ):
     """
     Params
@@ -511,29 +599,26 @@ def extract_progression_from_midi(
         quantize_beat: float, see params for `simplify_harmony()`
         simplified_path: str, if passed writes a midi file with simplified harmony. Useful for debugging.
         simplified_path: str, if passed writes a csv file with the output harman labels. Useful for debugging.
+        cache: MidiNoteCache, if passed the notes of the file are loaded through it, so that they are parsed once.
 
     Returns
         progression: Progression, the extracted progression object
         segment_start_times: list(float): the start times of each chord in seconds
     """
 
-    midi = load_midi_file(filepath)
+    midi_notes, tempos = load_midi_notes(filepath, cache=cache)
 
-    simplified = simplify_harmony(midi, shortest_note, smooth_beat, quantize_beat)
+    simplified = simplify_harmony_from_notes(
+        parse_note_array(midi_notes), tempos, shortest_note, smooth_beat, quantize_beat
+    )
 
     if simplified_path:
-        simplified.write(simplified_path)
+        mk_midi_from_notes(simplified).write(simplified_path)
         print(f"Wrote simplified midi to {simplified_path}")
 
-    harman_labels = label_midi(simplified)
+    harman_labels = label_notes(simplified)
 
     if harman_labels_path:
         _ = write_labels(harman_labels, filepath, harman_labels_path)
 
-    chords = [i["chord"] for i in harman_labels]
-    durations = [i["end_time"] - i["start_time"] for i in harman_labels]
-
-    bpms = [i[0] for i in midi.get_tempo_changes() if i[0] > 0]
-
-    # TODO: support tempo changes in progressions
-    return Progression(chords, durations, bpm=bpms[0], name=filepath)
+    return get_progression_from_labels(harman_labels, tempos, filepath)
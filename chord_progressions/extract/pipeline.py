@@ -0,0 +1,376 @@
+"""
+Runs `extract_progression_from_midi` as a pipeline of named stages, keeping the intermediate
+artifact of each stage, recording the time and peak memory each stage takes, and memoizing
+each stage by its input and parameters.
+"""
+
+import itertools
+import os
+import time
+import tracemalloc
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+from chord_progressions.extract.midi import (
+    DEFAULT_QUANTIZE_BEAT,
+    DEFAULT_SHORTEST_NOTE,
+    DEFAULT_SMOOTH_BEAT,
+    parse_note_array,
+    simplify_harmony_from_notes,
+)
+from chord_progressions.extract.midi_harman import (
+    get_progression_from_labels,
+    label_notes,
+)
+from chord_progressions.io.midi import load_midi_notes
+from chord_progressions.progression import Progression
+
+# The stages of the pipeline, in the order they run
+STAGES = ["load", "simplify", "label", "progression"]
+
+# The default number of artifacts memoized for each stage
+DEFAULT_MEMO_SIZE = 32
+
+# The parameters a sweep can vary, and the value of each one when it isn't in the grid
+SWEEP_PARAMETERS = {
+    "shortest_note": DEFAULT_SHORTEST_NOTE,
+    "smooth_beat": DEFAULT_SMOOTH_BEAT,
+    "quantize_beat": DEFAULT_QUANTIZE_BEAT,
+}
+
+
+class MidiNotes(NamedTuple):
+    """The pitched notes of a midi file as a (start, end, note) array sorted by start, and its tempo changes"""
+
+    notes: np.ndarray
+    tempos: tuple
+
+
+class SimplifiedNotes(NamedTuple):
+    """The notes left by `simplify_harmony_from_notes`, and the tempo changes of their file"""
+
+    notes: np.ndarray
+    tempos: tuple
+
+
+class HarmanLabels(NamedTuple):
+    """The segments labeled by `label_notes`, and the tempo changes of their file"""
+
+    labels: list
+    tempos: tuple
+
+
+class StageTiming(NamedTuple):
+    """The wall time and peak memory of a stage, or zeros if its artifact was memoized
+
+    `peak_bytes` is the peak memory allocated above what was allocated when the stage started,
+    or None if memory isn't traced.
+    """
+
+    stage: str
+    seconds: float
+    peak_bytes: int
+    cached: bool
+
+
+class ExtractionResult(NamedTuple):
+    """The progression extracted from `filepath`, the artifact of each stage, and the timing of each stage"""
+
+    filepath: str
+    progression: Progression
+    artifacts: dict
+    timings: list
+
+
+def _read_only(arr):
+    arr.flags.writeable = False
+    return arr
+
+
+def load_notes(filepath, cache=None):
+    midi_notes, tempos = load_midi_notes(filepath, cache=cache)
+
+    return MidiNotes(
+        _read_only(parse_note_array(midi_notes)),
+        tuple(_read_only(np.asarray(i)) for i in tempos),
+    )
+
+
+def simplify_notes(midi_notes, shortest_note, smooth_beat, quantize_beat):
+    simplified = simplify_harmony_from_notes(
+        midi_notes.notes, midi_notes.tempos, shortest_note, smooth_beat, quantize_beat
+    )
+
+    return SimplifiedNotes(_read_only(simplified), midi_notes.tempos)
+
+
+def label_simplified_notes(simplified):
+    return HarmanLabels(label_notes(simplified.notes), simplified.tempos)
+
+
+def get_progression_from_harman_labels(harman_labels, name):
+    return get_progression_from_labels(harman_labels.labels, harman_labels.tempos, name)
+
+
+def get_stage_breakdown(results):
+    """Returns a DataFrame with the timing of each stage of each `ExtractionResult` in `results`"""
+    rows = [
+        {"filepath": r.filepath, **timing._asdict()}
+        for r in results
+        for timing in r.timings
+    ]
+
+    return pd.DataFrame(rows, columns=["filepath", *StageTiming._fields])
+
+
+class ExtractionPipeline:
+    """Extracts progressions from midi files in the stages of `STAGES`: load -> simplify -> label -> progression.
+
+    The artifact of each stage is memoized by the key of its input and its parameters, so running the pipeline
+    again with only a later parameter changed reruns only the stages from that parameter on. Memoized artifacts
+    are shared between runs and must be treated as read-only.
+
+    Parameters
+    ----------
+    cache: MidiNoteCache, default None
+        If passed, the notes of each file are loaded through it, so that they are parsed once across processes.
+    memo_size: int, default DEFAULT_MEMO_SIZE
+        The number of artifacts memoized for each stage. The least recently used are evicted first.
+    trace_memory: bool, default True
+        Records the peak memory of each stage with tracemalloc, which slows down the stages it traces.
+    """
+
+    def __init__(self, cache=None, memo_size=DEFAULT_MEMO_SIZE, trace_memory=True):
+        self.cache = cache
+        self.memo_size = memo_size
+        self.trace_memory = trace_memory
+        self.hits = 0
+        self.misses = 0
+        self._memos = {stage: OrderedDict() for stage in STAGES}
+
+    def __len__(self):
+        return sum(len(memo) for memo in self._memos.values())
+
+    def get_file_key(self, filepath):
+        """Identifies a file by its path, size and modification time, so that its stages rerun when it changes"""
+        stat = os.stat(filepath)
+        return (os.path.realpath(filepath), stat.st_size, stat.st_mtime_ns)
+
+    def run_stage(self, stage, key, func, *args):
+        """Returns the artifact of `func(*args)` memoized by `key` for `stage`, and its timing"""
+        memo = self._memos[stage]
+
+        if key in memo:
+            self.hits += 1
+            memo.move_to_end(key)
+            peak_bytes = 0 if self.trace_memory else None
+            return memo[key], StageTiming(stage, 0.0, peak_bytes, True)
+
+        self.misses += 1
+
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+
+        try:
+            if self.trace_memory:
+                tracemalloc.reset_peak()
+                allocated = tracemalloc.get_traced_memory()[0]
+
+            start = time.perf_counter()
+            artifact = func(*args)
+            seconds = time.perf_counter() - start
+
+            peak_bytes = None
+            if self.trace_memory:
+                peak_bytes = tracemalloc.get_traced_memory()[1] - allocated
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+
+        memo[key] = artifact
+        if len(memo) > self.memo_size:
+            memo.popitem(last=False)
+
+        return artifact, StageTiming(stage, seconds, peak_bytes, False)
+
+    def run(
+        self,
+        filepath,
+        shortest_note=DEFAULT_SHORTEST_NOTE,
+        smooth_beat=DEFAULT_SMOOTH_BEAT,
+        quantize_beat=DEFAULT_QUANTIZE_BEAT,
+    ):
+        """Extracts the progression of `filepath`, see `extract_progression_from_midi()` for params
+
+        Returns an `ExtractionResult` with the artifact and timing of each stage.
+        """
+        load_key = self.get_file_key(filepath)
+        simplify_key = (load_key, shortest_note, smooth_beat, quantize_beat)
+        progression_key = (simplify_key, filepath)
+
+        midi_notes, load_timing = self.run_stage(
+            "load", load_key, load_notes, filepath, self.cache
+        )
+        simplified, simplify_timing = self.run_stage(
+            "simplify",
+            simplify_key,
+            simplify_notes,
+            midi_notes,
+            shortest_note,
+            smooth_beat,
+            quantize_beat,
+        )
+        harman_labels, label_timing = self.run_stage(
+            "label", simplify_key, label_simplified_notes, simplified
+        )
+        progression, progression_timing = self.run_stage(
+            "progression",
+            progression_key,
+            get_progression_from_harman_labels,
+            harman_labels,
+            filepath,
+        )
+
+        artifacts = {
+            "load": midi_notes,
+            "simplify": simplified,
+            "label": harman_labels,
+            "progression": progression,
+        }
+        timings = [load_timing, simplify_timing, label_timing, progression_timing]
+
+        return ExtractionResult(filepath, progression, artifacts, timings)
+
+    def clear(self):
+        """Removes every memoized artifact"""
+        for memo in self._memos.values():
+            memo.clear()
+
+
+def get_parameter_points(grid):
+    """Returns every combination of the values in `grid`, a dict of {parameter: values}
+
+    e.g. {"smooth_beat": [1, 1 / 2]} ->
+        [{"shortest_note": 1 / 64, "smooth_beat": 1, "quantize_beat": 1 / 2},
+         {"shortest_note": 1 / 64, "smooth_beat": 1 / 2, "quantize_beat": 1 / 2}]
+    """
+    unknown = set(grid) - set(SWEEP_PARAMETERS)
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters: {sorted(unknown)}")
+
+    values = [grid.get(k, [default]) for k, default in SWEEP_PARAMETERS.items()]
+
+    return [dict(zip(SWEEP_PARAMETERS, point)) for point in itertools.product(*values)]
+
+
+def _label_job(notes):
+    """Labels simplified notes in a worker process, returning the labels, seconds and error message"""
+    start = time.perf_counter()
+
+    try:
+        labels, error = label_notes(notes), None
+    except Exception as e:
+        labels, error = None, f"{type(e).__name__}: {e}"
+
+    return labels, time.perf_counter() - start, error
+
+
+def sweep_extraction_parameters(filepaths, grid, cache=None, max_workers=None):
+    """
+    Extracts the progression of every file in `filepaths` at every point of `grid`,
+    a dict of {parameter: values} for the parameters in `SWEEP_PARAMETERS`.
+
+    Each file is loaded once and its notes are simplified at every point. Labeling, the slow stage,
+    runs on a process pool of `max_workers` workers, once per distinct set of simplified notes,
+    so points that simplify a file to the same notes share its labels.
+
+    Returns a DataFrame with a row per file and point, with the parameters, the progression,
+    the seconds taken by each stage, whether the labels were shared with an earlier row, and the error.
+    The columns of the stages a row didn't get to, and the error of a row that succeeded, are missing.
+    """
+    points = get_parameter_points(grid)
+
+    rows = []
+    jobs = {}
+
+    for filepath in filepaths:
+        start = time.perf_counter()
+
+        try:
+            midi_notes, error = load_notes(filepath, cache), None
+        except Exception as e:
+            midi_notes, error = None, f"{type(e).__name__}: {e}"
+
+        load_seconds = time.perf_counter() - start
+
+        for point in points:
+            row = {"filepath": filepath, **point, "load_seconds": load_seconds}
+            rows.append(row)
+
+            if error:
+                row["error"] = error
+                continue
+
+            start = time.perf_counter()
+            try:
+                simplified = simplify_notes(midi_notes, **point)
+            except Exception as e:
+                row["error"] = f"{type(e).__name__}: {e}"
+                continue
+            row["simplify_seconds"] = time.perf_counter() - start
+
+            # the simplified notes and tempos of the row, whose labels are looked up below
+            row["simplified"] = simplified
+            row["job"] = simplified.notes.tobytes()
+            jobs.setdefault(row["job"], simplified.notes)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        # batch small jobs to cut down on inter-process overhead
+        chunksize = max(1, len(jobs) // (4 * (max_workers or os.cpu_count() or 1)))
+        labels = dict(
+            zip(jobs, executor.map(_label_job, jobs.values(), chunksize=chunksize))
+        )
+
+    labeled = set()
+
+    for row in rows:
+        job = row.pop("job", None)
+        simplified = row.pop("simplified", None)
+
+        if job is None:
+            continue
+
+        harman_labels, row["label_seconds"], error = labels[job]
+        row["shared"] = job in labeled
+        labeled.add(job)
+
+        if error:
+            row["error"] = error
+            continue
+
+        start = time.perf_counter()
+        try:
+            row["progression"] = get_progression_from_harman_labels(
+                HarmanLabels(harman_labels, simplified.tempos), row["filepath"]
+            )
+        except Exception as e:
+            row["error"] = f"{type(e).__name__}: {e}"
+        row["progression_seconds"] = time.perf_counter() - start
+
+    columns = [
+        "filepath",
+        *SWEEP_PARAMETERS,
+        "progression",
+        "load_seconds",
+        "simplify_seconds",
+        "label_seconds",
+        "progression_seconds",
+        "shared",
+        "error",
+    ]
+
+    return pd.DataFrame(rows, columns=columns)
@@ -1,34 +1,238 @@
+import os
+import struct
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
 import numpy as np
 from chord_progressions import logger
-from chord_progressions.pitch import get_freq_from_note, get_n_overtones_harmonic
+from chord_progressions.pitch import get_freq_from_note
 from scipy.io import wavfile
 
 SAMPLE_RATE = 44100
 
+# The number of samples rendered at a time when streaming audio to a file
+BLOCK_SIZE = 2**16
 
-def mk_sin(freq, duration, amp):
-    s = [
-        amp * np.sin(n * 2 * np.pi * freq / SAMPLE_RATE)
-        for n in range(int(duration * SAMPLE_RATE))
-    ]
-    return np.array(s).reshape(-1, 1)
+# The default size limit of `BUFFER_CACHE`
+BUFFER_CACHE_MAX_BYTES = 64 * 2**20
 
+# The number of samples in one cycle of a wavetable
+WAVETABLE_SIZE = 4096
+
+# The rhythms each note of an arpeggiated chord chooses from, stretched over the chord
+DEFAULT_ARPEGGIO_SEQS = [
+    [1, 1, 1, 1],
+    [1, 0, 1, 0],
+    [0, 1, 0, 1],
+    [1, 0, 0, 0],
+    [1, 1, 0, 1, 1, 0],
+    [1, 0, 1, 1, 0, 1, 0, 1],
+]
+
+# The oscillator and sample rate used to render audio at each quality
+QUALITIES = {
+    # sample-exact sines
+    "high": {"oscillator": "sine", "sample_rate": SAMPLE_RATE},
+    # wavetable lookups, indistinguishable by ear for sustained chords
+    "medium": {"oscillator": "wavetable", "sample_rate": SAMPLE_RATE},
+    # wavetable lookups at half the sample rate, for interactive previews
+    "preview": {"oscillator": "wavetable", "sample_rate": SAMPLE_RATE // 2},
+}
+
+
+class BufferCache:
+    """An LRU cache of rendered audio buffers, bounded by their total size in bytes.
+
+    Cached buffers are read-only, since they are shared between callers.
+
+    Parameters
+    ----------
+    max_bytes: int, default BUFFER_CACHE_MAX_BYTES
+        The least recently used buffers are evicted when the total size of the cached buffers exceeds `max_bytes`.
+    """
+
+    def __init__(self, max_bytes: int = BUFFER_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._buffers = OrderedDict()
+
+    def __len__(self):
+        return len(self._buffers)
+
+    def __contains__(self, key):
+        return key in self._buffers
+
+    def get(self, key):
+        """Returns the buffer cached for `key`, or None"""
+        buf = self._buffers.get(key)
+
+        if buf is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._buffers.move_to_end(key)
+        return buf
+
+    def put(self, key, buf):
+        """Caches `buf` for `key` unless it is larger than the whole cache, and returns it read-only"""
+        buf.setflags(write=False)
+
+        if buf.nbytes > self.max_bytes:
+            return buf
+
+        if key in self._buffers:
+            self.nbytes -= self._buffers.pop(key).nbytes
+
+        self._buffers[key] = buf
+        self.nbytes += buf.nbytes
+
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._buffers.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+            self.evictions += 1
+
+        return buf
+
+    def get_or_render(self, key, render):
+        """Returns the buffer cached for `key`, calling `render()` to create it on a miss"""
+        buf = self.get(key)
+
+        if buf is None:
+            buf = self.put(key, render())
+
+        return buf
+
+    def clear(self):
+        self._buffers.clear()
+        self.nbytes = 0
+
+    def info(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "buffers": len(self),
+            "nbytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+        }
 
-def mk_freq_buffer(freq, duration, n_overtones):
-    freqs = get_n_overtones_harmonic(freq, n_overtones)
 
+# Shared by `make_audio_progression` and `save_sample_chord_audio`
+BUFFER_CACHE = BufferCache()
+
+
+def mk_sin(freq, duration, amp):
+    n = np.arange(int(duration * SAMPLE_RATE))
+    return (amp * np.sin(n * 2 * np.pi * freq / SAMPLE_RATE)).reshape(-1, 1)
+
+
+def get_overtone_amps(n_overtones):
+    """The amplitude of the fundamental and each overtone of a note, summing to at most 1"""
     # make each overtone progressively quieter
-    sins = [mk_sin(f, duration, 1 / 2**i) for i, f in enumerate(freqs)]
+    amps = 1 / 2 ** np.arange(n_overtones + 1)
 
     # TODO: normalize such that all notes have the same amplitude
     # regardless of the number of frequencies
-    normed_sins = [s / len(sins) for s in sins]
+    return amps / len(amps)
+
+
+def get_partials(freqs, n_overtones):
+    """Returns the frequencies and amplitudes of the partials of all `freqs`, with equal weight per note"""
+    freqs = np.asarray(freqs, dtype=float)
+
+    partial_freqs = np.outer(freqs, np.arange(1, n_overtones + 2)).ravel()
+    partial_amps = np.tile(get_overtone_amps(n_overtones), len(freqs))
+
+    return partial_freqs, partial_amps
+
+
+def mk_additive_buffer(freqs, amps, n_samples, offset=0, sample_rate=SAMPLE_RATE):
+    """
+    Sums sines with frequencies `freqs` and amplitudes `amps` in one vectorized operation.
+    `offset` is the index of the first sample, so a long buffer can be rendered in consecutive parts.
+    """
+    n = np.arange(offset, offset + n_samples)
+
+    phases = np.outer(n, 2 * np.pi * np.asarray(freqs) / sample_rate)
+
+    return np.sin(phases) @ np.asarray(amps, dtype=float)
+
+
+@lru_cache(maxsize=None)
+def get_wavetable(n_overtones):
+    """
+    One cycle of a note with `n_overtones` overtones, sampled at WAVETABLE_SIZE points.
+    The first sample is repeated at the end so that lookups can interpolate across the wrap.
+    """
+    phases = 2 * np.pi * np.arange(WAVETABLE_SIZE + 1) / WAVETABLE_SIZE
+    harmonics = np.arange(1, n_overtones + 2)
+
+    table = np.sin(np.outer(phases, harmonics)) @ get_overtone_amps(n_overtones)
+    table.flags.writeable = False
+
+    return table
+
+
+def mk_wavetable_matrix(
+    freqs, n_overtones, n_samples, offset=0, sample_rate=SAMPLE_RATE
+):
+    """
+    Reads the wavetable of `n_overtones` with a phase increment per note, interpolating linearly.
+    Returns a (n_samples, len(freqs)) matrix with one column per note.
+    """
+    table = get_wavetable(n_overtones)
+    n = np.arange(offset, offset + n_samples)
+
+    # the fractional position in the table of each sample of each note
+    increments = np.asarray(freqs, dtype=float) * WAVETABLE_SIZE / sample_rate
+    positions = np.outer(n, increments) % WAVETABLE_SIZE
+
+    ixs = positions.astype(int)
+    fracs = positions - ixs
+    return table[ixs] + fracs * (table[ixs + 1] - table[ixs])
+
+
+def mk_wavetable_buffer(
+    freqs, n_overtones, n_samples, offset=0, sample_rate=SAMPLE_RATE
+):
+    """
+    Approximates `mk_additive_buffer` for notes with fundamentals `freqs` and `n_overtones`.
+    Each note is weighted equally.
+    """
+    samples = mk_wavetable_matrix(freqs, n_overtones, n_samples, offset, sample_rate)
+
+    return samples.sum(axis=1) / max(len(freqs), 1)
+
+
+def get_quality_settings(quality):
+    """The oscillator and sample rate of a quality in QUALITIES"""
+    if quality not in QUALITIES:
+        raise ValueError(
+            f"Unknown quality: {quality}, expected one of {list(QUALITIES)}"
+        )
+
+    return QUALITIES[quality]
+
+
+def mk_freq_buffer(freq, duration, n_overtones):
+    freqs, amps = get_partials([freq], n_overtones)
 
     # combine the overtones to make a note
-    return sum(normed_sins)
+    return mk_additive_buffer(freqs, amps, int(duration * SAMPLE_RATE)).reshape(-1, 1)
 
 
-def mk_note_buffer(note, duration, n_overtones):
+def mk_note_buffer(note, duration, n_overtones, cache=None):
+    """Renders a note, reusing buffers through a BufferCache if `cache` is passed"""
+    if cache is not None:
+        key = ("note", note, duration, n_overtones, SAMPLE_RATE)
+        return cache.get_or_render(
+            key, lambda: mk_note_buffer(note, duration, n_overtones)
+        )
 
     freq = get_freq_from_note(note)
 
@@ -43,64 +247,278 @@ def combine_buffers(buffers):
     return np.sum(normed, axis=1).astype("float32")
 
 
-def mk_chord_buffer(chord, duration, n_overtones):
-    logger.debug(f"Generating {duration} second buffer for chord: {chord}")
+def get_chord_partials(chord, n_overtones):
+    """Returns the frequencies and amplitudes of the partials of all notes in a chord. Each note is weighted equally."""
+    freqs, amps = get_partials([get_freq_from_note(n) for n in chord], n_overtones)
 
-    note_buffers = [mk_note_buffer(note, duration, n_overtones) for note in chord]
+    return freqs, amps / max(len(chord), 1)
 
-    return combine_buffers(note_buffers)
 
+def mk_chord_samples(chord, n_samples, n_overtones, offset=0, quality="high"):
+    """Renders `n_samples` of a chord from sample `offset` with the oscillator and sample rate of `quality`"""
+    settings = get_quality_settings(quality)
 
-def mk_arpeggiated_chord_buffer(chord, duration, seqs, n_overtones):
+    if settings["oscillator"] == "wavetable":
+        freqs = [get_freq_from_note(n) for n in chord]
+        return mk_wavetable_buffer(
+            freqs, n_overtones, n_samples, offset, settings["sample_rate"]
+        )
 
-    logger.debug(f"Generating {duration} second arpeggiated buffer for chord: {chord}")
+    freqs, amps = get_chord_partials(chord, n_overtones)
 
-    selected_seqs = [seqs[np.random.randint(len(seqs))] for i in range(len(chord))]
+    return mk_additive_buffer(freqs, amps, n_samples, offset, settings["sample_rate"])
 
-    bufs = []
 
-    for note, seq in zip(chord, selected_seqs):
-        logger.debug(f"  {note} got rhythm {''.join(map(str, seq))}")
+def mk_chord_buffer(chord, duration, n_overtones, cache=None, quality="high"):
+    """
+    Renders all notes and overtones of a chord, reusing buffers through a BufferCache if `cache` is passed.
+    The buffer is filled `BLOCK_SIZE` samples at a time, so that the partials of only one block are held in memory.
+    """
+    settings = get_quality_settings(quality)
+
+    if cache is not None:
+        key = (
+            "chord",
+            tuple(chord),
+            duration,
+            n_overtones,
+            settings["sample_rate"],
+            settings["oscillator"],
+        )
+        return cache.get_or_render(
+            key, lambda: mk_chord_buffer(chord, duration, n_overtones, quality=quality)
+        )
+
+    logger.debug(f"Generating {duration} second {quality} buffer for chord: {chord}")
+
+    n_samples = int(duration * settings["sample_rate"])
+    buf = np.empty(n_samples, dtype="float32")
+
+    for offset in range(0, n_samples, BLOCK_SIZE):
+        n_block_samples = min(BLOCK_SIZE, n_samples - offset)
+        buf[offset : offset + n_block_samples] = mk_chord_samples(
+            chord, n_block_samples, n_overtones, offset, quality
+        )
+
+    return buf
 
-        pos_dur = duration / len(seq)
 
-        seq_bufs = []
+def mk_note_matrix(chord, n_samples, n_overtones, offset=0, quality="high"):
+    """Renders `n_samples` of each note of a chord from sample `offset` as a (n_samples, len(chord)) matrix"""
+    settings = get_quality_settings(quality)
+    freqs = [get_freq_from_note(n) for n in chord]
 
-        for pos in seq:
+    if settings["oscillator"] == "wavetable":
+        return mk_wavetable_matrix(
+            freqs, n_overtones, n_samples, offset, settings["sample_rate"]
+        )
 
-            if pos == 1:
-                seq_bufs.append(mk_note_buffer(note, pos_dur, n_overtones))
+    partial_freqs, partial_amps = get_partials(freqs, n_overtones)
+    n = np.arange(offset, offset + n_samples)
 
-            else:
-                seq_bufs.append(mk_sin(0, pos_dur, 0))
+    phases = np.outer(n, 2 * np.pi * partial_freqs / settings["sample_rate"])
+    partials = np.sin(phases) * partial_amps
 
-        bufs.append(np.concatenate(seq_bufs))
+    # sum the partials of each note
+    return partials.reshape(n_samples, len(chord), n_overtones + 1).sum(axis=2)
 
-    # TODO: would these 0s be better placed somewhere in the middle of the bufs?
-    max_buf_len = max([b.shape[0] for b in bufs])
 
-    # TODO: can be simplified
-    for ix, buf in enumerate(bufs):
-        padding = np.zeros((max_buf_len - len(buf), 1))
-        bufs[ix] = np.concatenate([buf, padding])
+def get_arpeggio_gates(seqs, n_samples, offset=0, n_gate_samples=None):
+    """
+    Stretches each rhythm in `seqs` over `n_samples`, e.g. [1, 0] is on for the first half.
+    Returns a (n_gate_samples, len(seqs)) matrix of 0s and 1s with one column per rhythm,
+    from sample `offset`, covering all `n_samples` by default.
+    """
+    if n_gate_samples is None:
+        n_gate_samples = n_samples - offset
+
+    lengths = np.array([len(seq) for seq in seqs])
+
+    padded = np.zeros((len(seqs), lengths.max(initial=1)))
+    for ix, seq in enumerate(seqs):
+        padded[ix, : len(seq)] = seq
+
+    # the rhythm position of each sample for each rhythm
+    positions = (
+        np.outer(np.arange(offset, offset + n_gate_samples), lengths) // n_samples
+    )
+
+    return padded[np.arange(len(seqs)), positions]
+
+
+def mk_arpeggiated_chord_buffer(
+    chord,
+    duration,
+    seqs=DEFAULT_ARPEGGIO_SEQS,
+    n_overtones=4,
+    rng=None,
+    quality="high",
+):
+    """
+    Renders a chord with each note playing a rhythm chosen from `seqs` by `rng`,
+    a `numpy.random.Generator`, so that a seeded generator gives the same audio every time.
+    Each note is weighted equally. The buffer is filled `BLOCK_SIZE` samples at a time.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+
+    logger.debug(f"Generating {duration} second arpeggiated buffer for chord: {chord}")
+
+    selected_seqs = [seqs[ix] for ix in rng.integers(len(seqs), size=len(chord))]
+
+    for note, seq in zip(chord, selected_seqs):
+        logger.debug(f"  {note} got rhythm {''.join(map(str, seq))}")
+
+    n_samples = int(duration * get_quality_settings(quality)["sample_rate"])
 
-    return np.sum(bufs, axis=0)
+    buf = np.empty(n_samples, dtype="float32")
+
+    for offset in range(0, n_samples, BLOCK_SIZE):
+        n_block_samples = min(BLOCK_SIZE, n_samples - offset)
+
+        notes = mk_note_matrix(chord, n_block_samples, n_overtones, offset, quality)
+        gates = get_arpeggio_gates(selected_seqs, n_samples, offset, n_block_samples)
+
+        block = (notes * gates).sum(axis=1) / max(len(chord), 1)
+        buf[offset : offset + n_block_samples] = block
+
+    return buf
 
 
 def save_sample_chord_audio(chord, chord_type):
-    buf = mk_chord_buffer(chord, duration=1, n_overtones=1)
+    buf = mk_chord_buffer(chord, duration=1, n_overtones=1, cache=BUFFER_CACHE)
     filename = chord_type.replace("/", "_").replace(" ", "")
     outpath = f"sample_chords/{filename}.wav"
     save_audio_buffer(buf, outpath)
 
 
-def make_audio_progression(chords, durations, n_overtones):
+def make_audio_progression(
+    chords, durations, n_overtones, cache=BUFFER_CACHE, quality="high"
+):
+    """Renders a progression, reusing the buffers of repeated chords through `cache` unless it is None"""
     buffers = [
-        mk_chord_buffer(c.notes, d, n_overtones) for c, d in zip(chords, durations)
+        mk_chord_buffer(c.notes, d, n_overtones, cache, quality)
+        for c, d in zip(chords, durations)
     ]
 
     return np.concatenate(buffers)
 
 
-def save_audio_buffer(buf, outpath):
-    wavfile.write(outpath, SAMPLE_RATE, buf)
+def iter_arpeggiated_audio_progression(
+    chords,
+    durations,
+    n_overtones,
+    seqs=DEFAULT_ARPEGGIO_SEQS,
+    rng=None,
+    quality="high",
+):
+    """Renders a progression as one arpeggiated float32 buffer per chord"""
+    if rng is None:
+        rng = np.random.default_rng()
+
+    for chord, duration in zip(chords, durations):
+        yield mk_arpeggiated_chord_buffer(
+            chord.notes, duration, seqs, n_overtones, rng, quality
+        )
+
+
+def _render_chord_job(job):
+    """Renders a (notes, duration, n_overtones, quality) job in a worker process"""
+    notes, duration, n_overtones, quality = job
+    return mk_chord_buffer(notes, duration, n_overtones, quality=quality)
+
+
+def make_audio_progressions_parallel(
+    progressions, n_overtones, max_workers=None, quality="high"
+):
+    """
+    Renders a list of (chords, durations) pairs on a process pool of `max_workers` workers,
+    one job per distinct chord and duration, and assembles each progression in order.
+    Returns the same buffers as `make_audio_progression`.
+    """
+    progression_jobs = [
+        [(tuple(c.notes), d, n_overtones, quality) for c, d in zip(chords, durations)]
+        for chords, durations in progressions
+    ]
+
+    # a chord that repeats within or across progressions is rendered once
+    jobs = list(dict.fromkeys(job for p in progression_jobs for job in p))
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        # batch small jobs to cut down on inter-process overhead
+        chunksize = max(1, len(jobs) // (4 * (max_workers or os.cpu_count() or 1)))
+        buffers = dict(
+            zip(jobs, executor.map(_render_chord_job, jobs, chunksize=chunksize))
+        )
+
+    return [np.concatenate([buffers[job] for job in p]) for p in progression_jobs]
+
+
+def make_audio_progression_parallel(
+    chords, durations, n_overtones, max_workers=None, quality="high"
+):
+    """Renders a progression like `make_audio_progression`, with its chords split across a process pool"""
+    return make_audio_progressions_parallel(
+        [(chords, durations)], n_overtones, max_workers, quality
+    )[0]
+
+
+def iter_audio_progression(
+    chords, durations, n_overtones, block_size=BLOCK_SIZE, quality="high"
+):
+    """
+    Renders a progression chord by chord as float32 blocks of at most `block_size` samples.
+    Concatenating the blocks gives the buffer from `make_audio_progression`.
+    """
+    sample_rate = get_quality_settings(quality)["sample_rate"]
+
+    for chord, duration in zip(chords, durations):
+        n_samples = int(duration * sample_rate)
+
+        for offset in range(0, n_samples, block_size):
+            n_block_samples = min(block_size, n_samples - offset)
+            block = mk_chord_samples(
+                chord.notes, n_block_samples, n_overtones, offset, quality
+            )
+
+            yield block.astype("float32")
+
+
+def get_wav_header(n_samples, sample_rate=SAMPLE_RATE):
+    """The header that `wavfile.write` uses for a mono float32 buffer of `n_samples`"""
+    data_size = n_samples * 4
+
+    return b"".join(
+        [
+            b"RIFF",
+            struct.pack("<I", 50 + data_size),
+            b"WAVE",
+            b"fmt ",
+            # chunk size, IEEE float format, channels, sample rate, byte rate, block align, bits, extension size
+            struct.pack("<IHHIIHHH", 18, 3, 1, sample_rate, sample_rate * 4, 4, 32, 0),
+            b"fact",
+            struct.pack("<II", 4, n_samples),
+            b"data",
+            struct.pack("<I", data_size),
+        ]
+    )
+
+
+def save_audio_blocks(blocks, outpath, sample_rate=SAMPLE_RATE):
+    """Writes an iterable of float32 blocks to a WAV file without holding more than one block in memory"""
+    n_samples = 0
+
+    with open(outpath, "wb") as f:
+        # the sizes in the header are filled in once all blocks are written
+        f.write(get_wav_header(0, sample_rate))
+
+        for block in blocks:
+            f.write(np.asarray(block, dtype="<f4").tobytes())
+            n_samples += len(block)
+
+        f.seek(0)
+        f.write(get_wav_header(n_samples, sample_rate))
+
+
+def save_audio_buffer(buf, outpath, sample_rate=SAMPLE_RATE):
+    wavfile.write(outpath, sample_rate, buf)
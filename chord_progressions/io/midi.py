@@ -1,9 +1,25 @@
+import hashlib
+import itertools
+import mmap
+import os
+import re
+import struct
+import time
 import warnings
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import lru_cache
 
 import mido
+import numpy as np
 import pretty_midi
-from chord_progressions import DEFAULT_BPM, DEFAULT_MIDI_TICKS_PER_BEAT
-from chord_progressions.midi import get_midi_ticks_from_seconds, make_midi_chord
+from chord_progressions import DEFAULT_BPM, DEFAULT_MIDI_TICKS_PER_BEAT, logger
+from chord_progressions.midi import (
+    get_constant_tempo_changes,
+    get_midi_ticks_from_seconds,
+    get_midi_ticks_from_seconds_array,
+    make_midi_chord,
+)
 
 
 def load_midi_file(filepath):
@@ -19,6 +35,419 @@ def load_midi_file(filepath):
     return midi
 
 
+# The notes parsed by `load_midi_notes`, with the program number of each note's instrument
+MIDI_NOTES_DTYPE = np.dtype(
+    [
+        ("start", float),
+        ("end", float),
+        ("pitch", int),
+        ("instrument", int),
+        ("is_drum", bool),
+    ]
+)
+
+# the number of data bytes after each channel message status, by its high nibble
+CHANNEL_MESSAGE_LENGTHS = {0x8: 2, 0x9: 2, 0xA: 2, 0xB: 2, 0xC: 1, 0xD: 1, 0xE: 2}
+
+# the number of data bytes after each system common and realtime status
+SYSTEM_MESSAGE_LENGTHS = {
+    0xF1: 1,
+    0xF2: 2,
+    0xF3: 1,
+    0xF6: 0,
+    0xF8: 0,
+    0xFA: 0,
+    0xFB: 0,
+    0xFC: 0,
+    0xFE: 0,
+}
+
+DRUM_CHANNEL = 9
+
+
+def read_variable_int(data, pos):
+    """Reads a MIDI variable length quantity at `pos`, returning its value and the position after it"""
+    value = 0
+
+    while True:
+        byte = data[pos]
+        pos += 1
+        value = (value << 7) | (byte & 0x7F)
+
+        if byte < 0x80:
+            return value, pos
+
+
+def parse_midi_track(data, pos, end):
+    """
+    Parses the events of a track chunk spanning data[pos:end], pairing note ons and offs
+    the way pretty_midi does. Returns the notes as (start_tick, end_tick, pitch, program, channel)
+    tuples grouped by (program, channel) in order of their first note, and the tempos
+    as (tick, microseconds per beat) tuples.
+    """
+    notes_by_instrument = {}
+    tempos = []
+
+    # the start ticks of the sounding notes by (channel, pitch)
+    open_notes = {}
+    programs = [0] * 16
+
+    tick = 0
+    running_status = None
+
+    while pos < end:
+        delta, pos = read_variable_int(data, pos)
+        tick += delta
+
+        status = data[pos]
+        pos += 1
+
+        if status < 0x80:
+            if running_status is None or running_status >= 0xF0:
+                raise OSError("Running status without a channel message status")
+
+            # the byte is the first data byte of a message with the last status
+            status = running_status
+            pos -= 1
+
+        elif status == 0xFF:
+            meta_type = data[pos]
+            length, pos = read_variable_int(data, pos + 1)
+
+            if meta_type == 0x51:
+                tempos.append((tick, int.from_bytes(data[pos : pos + 3], "big")))
+
+            pos += length
+            continue
+
+        else:
+            running_status = status
+
+        if status in (0xF0, 0xF7):
+            length, pos = read_variable_int(data, pos)
+            pos += length
+            continue
+
+        if status >= 0xF0:
+            if status not in SYSTEM_MESSAGE_LENGTHS:
+                raise OSError(f"Undefined status byte 0x{status:02x}")
+
+            pos += SYSTEM_MESSAGE_LENGTHS[status]
+            continue
+
+        kind, channel = status >> 4, status & 0xF
+        n_data = CHANNEL_MESSAGE_LENGTHS[kind]
+        data1 = data[pos]
+        data2 = data[pos + 1] if n_data == 2 else 0
+        pos += n_data
+
+        if data1 > 127 or data2 > 127:
+            raise OSError("Data bytes must be in range 0..127")
+
+        if kind == 0xC:
+            programs[channel] = data1
+
+        elif kind == 0x9 and data2 > 0:
+            open_notes.setdefault((channel, data1), []).append(tick)
+
+        elif kind == 0x8 or kind == 0x9:
+            start_ticks = open_notes.get((channel, data1))
+            if start_ticks is None:
+                continue
+
+            # a note off closes every note of the pitch that did not start on the same tick
+            to_close = [t for t in start_ticks if t != tick]
+            to_keep = [t for t in start_ticks if t == tick]
+
+            program = programs[channel]
+            for start_tick in to_close:
+                notes_by_instrument.setdefault((program, channel), []).append(
+                    (start_tick, tick, data1, program, channel)
+                )
+
+            if to_close and to_keep:
+                open_notes[(channel, data1)] = to_keep
+            else:
+                del open_notes[(channel, data1)]
+
+    if pos != end:
+        raise OSError("Track events overrun the track chunk")
+
+    notes = [
+        n for instrument_notes in notes_by_instrument.values() for n in instrument_notes
+    ]
+    return notes, tempos
+
+
+def get_tick_scales(tempos, resolution):
+    """
+    Returns the (tick, seconds per tick) of each tempo change, like pretty_midi:
+    starting at 120 bpm, and skipping changes that do not change the tempo.
+    """
+    tick_scales = [(0, 60.0 / (120.0 * resolution))]
+
+    for tick, tempo in tempos:
+        bpm = 6e7 / tempo
+
+        if tick == 0:
+            tick_scales = [(0, 60.0 / (bpm * resolution))]
+        elif 60.0 / (bpm * resolution) != tick_scales[-1][1]:
+            tick_scales.append((tick, 60.0 / (bpm * resolution)))
+
+    return tick_scales
+
+
+def get_times_from_ticks(ticks, tick_scales):
+    """Converts an array of ticks to seconds, with the same floating point results as pretty_midi"""
+    start_ticks = np.array([t for t, _ in tick_scales])
+    scales = np.array([s for _, s in tick_scales])
+
+    # the time at which each tempo starts
+    start_times = np.zeros(len(tick_scales))
+    for ix in range(1, len(tick_scales)):
+        ticks_in_prev = start_ticks[ix] - start_ticks[ix - 1]
+        start_times[ix] = start_times[ix - 1] + scales[ix - 1] * ticks_in_prev
+
+    ixs = np.searchsorted(start_ticks, ticks, side="right") - 1
+
+    return start_times[ixs] + scales[ixs] * (ticks - start_ticks[ixs])
+
+
+def parse_midi_notes(data):
+    """
+    Parses the bytes of a Standard MIDI File into an array of MIDI_NOTES_DTYPE and its tempo changes,
+    without building intermediate objects. Notes and tempo changes are the same as those of
+    a pretty_midi.PrettyMIDI, i.e. in the order of iterating over its instruments and their notes,
+    and in the shape of `PrettyMIDI.get_tempo_changes()`.
+    """
+    if bytes(data[:4]) != b"MThd":
+        raise OSError("MThd not found. Probably not a MIDI file")
+
+    (header_size,) = struct.unpack_from(">L", data, 4)
+    _, n_tracks, resolution = struct.unpack_from(">hhh", data, 8)
+
+    notes = []
+    tempos = []
+    pos = 8 + header_size
+
+    for track_ix in range(n_tracks):
+        name, size = struct.unpack_from(">4sL", data, pos)
+        if name != b"MTrk":
+            raise OSError("No MTrk header at start of track")
+
+        track_notes, track_tempos = parse_midi_track(data, pos + 8, pos + 8 + size)
+        notes += track_notes
+        pos += 8 + size
+
+        # like pretty_midi, only tempos in the first track are used
+        if track_ix == 0:
+            tempos = track_tempos
+
+    tick_scales = get_tick_scales(tempos, resolution)
+
+    ticks = np.array([n[:2] for n in notes], dtype=np.int64).reshape(-1, 2)
+    times = get_times_from_ticks(ticks, tick_scales)
+
+    note_array = np.zeros(len(notes), dtype=MIDI_NOTES_DTYPE)
+    note_array["start"] = times[:, 0]
+    note_array["end"] = times[:, 1]
+    note_array["pitch"] = [n[2] for n in notes]
+    note_array["instrument"] = [n[3] for n in notes]
+    note_array["is_drum"] = [n[4] == DRUM_CHANNEL for n in notes]
+
+    tick_scale_ticks = np.array([t for t, _ in tick_scales])
+    tempo_change_times = get_times_from_ticks(tick_scale_ticks, tick_scales)
+    tempi = np.array([60.0 / (s * resolution) for _, s in tick_scales])
+
+    return note_array, (tempo_change_times, tempi)
+
+
+def load_midi_notes(filepath, use_mmap=False, cache=None):
+    """
+    Loads the notes and tempo changes of a MIDI file with `parse_midi_notes`,
+    reading it through a memory map if `use_mmap` is set, or through a MidiNoteCache if `cache` is passed.
+    """
+    if cache is not None:
+        return cache.load(filepath)
+
+    with open(filepath, "rb") as f:
+        if not use_mmap:
+            return parse_midi_notes(f.read())
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return parse_midi_notes(data)
+
+
+# Changes whenever `parse_midi_notes` gives different results, so that stale cached notes are not used
+MIDI_LOADER_VERSION = 1
+
+# The default size limit of a MidiNoteCache
+MIDI_NOTE_CACHE_MAX_BYTES = 2**30
+
+
+class MidiNoteCache:
+    """An on-disk LRU cache of the notes and tempo changes of MIDI files, bounded by its total size in bytes.
+
+    Entries are keyed by a hash of the file contents and MIDI_LOADER_VERSION, so renamed or
+    copied files share an entry and edited files get a new one. Each entry is a pair of .npy files
+    that can be read through a memory map. The cache directory can be shared between processes.
+
+    Parameters
+    ----------
+    cache_dir: str
+        The directory to store cached arrays in. It is created if it does not exist.
+    max_bytes: int, default MIDI_NOTE_CACHE_MAX_BYTES
+        The least recently used entries are deleted when the total size of the cache exceeds `max_bytes`.
+    mmap_mode: str or None, default "r"
+        The `mmap_mode` cached note arrays are loaded with, or None to read them into memory.
+    """
+
+    def __init__(self, cache_dir, max_bytes=MIDI_NOTE_CACHE_MAX_BYTES, mmap_mode="r"):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.mmap_mode = mmap_mode
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # the size of each entry by key, from least to most recently used
+        self._entries = OrderedDict()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._index_entries()
+
+    def _index_entries(self):
+        """Indexes the entries already in the cache directory, ordered by when they were last used"""
+        entries = []
+
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".notes.npy"):
+                key = entry.name[: -len(".notes.npy")]
+                stat = entry.stat()
+                entries.append((stat.st_mtime, key, stat.st_size))
+
+        for _, key, size in sorted(entries):
+            tempos_path = self._get_paths(key)[1]
+            if os.path.exists(tempos_path):
+                self._add_entry(key, size + os.path.getsize(tempos_path))
+
+    def _get_paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return f"{base}.notes.npy", f"{base}.tempos.npy"
+
+    def _add_entry(self, key, size):
+        self._entries[key] = size
+        self.nbytes += size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    @staticmethod
+    def get_key(data):
+        """The key of the bytes of a MIDI file"""
+        digest = hashlib.sha1(data)
+        digest.update(f"loader-v{MIDI_LOADER_VERSION}".encode())
+
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Returns the notes and tempo changes cached for `key`, or None"""
+        notes_path, tempos_path = self._get_paths(key)
+
+        try:
+            notes = np.load(notes_path, mmap_mode=self.mmap_mode)
+            tempos = np.load(tempos_path)
+        except (FileNotFoundError, ValueError):
+            # another process evicted the entry, or is still writing it
+            self.misses += 1
+            return None
+
+        self.hits += 1
+
+        try:
+            # the modification time orders entries by use across processes
+            os.utime(notes_path)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            else:
+                size = os.path.getsize(notes_path) + os.path.getsize(tempos_path)
+                self._add_entry(key, size)
+        except FileNotFoundError:
+            # another process evicted the entry after it was loaded
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)
+
+        return notes, (tempos[0], tempos[1])
+
+    def put(self, key, notes, tempos):
+        """Writes the notes and tempo changes of `key` to the cache, evicting the least recently used entries"""
+        size = 0
+
+        for path, arr in zip(self._get_paths(key), [notes, np.array(tempos)]):
+            # write to a temporary file first so that readers never see a partial array
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, arr)
+            os.replace(tmp_path, path)
+            size += os.path.getsize(path)
+
+        if key in self._entries:
+            self.nbytes -= self._entries.pop(key)
+
+        self._add_entry(key, size)
+
+        while self.nbytes > self.max_bytes and len(self._entries) > 1:
+            self._evict()
+
+    def _evict(self):
+        self._remove(next(iter(self._entries)))
+        self.evictions += 1
+
+    def _remove(self, key):
+        self.nbytes -= self._entries.pop(key)
+
+        for path in self._get_paths(key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def load(self, filepath):
+        """Returns the notes and tempo changes of a MIDI file, parsing and caching them on a miss"""
+        with open(filepath, "rb") as f:
+            data = f.read()
+
+        key = self.get_key(data)
+        cached = self.get(key)
+
+        if cached is not None:
+            return cached
+
+        notes, tempos = parse_midi_notes(data)
+        self.put(key, notes, tempos)
+
+        return notes, tempos
+
+    def clear(self):
+        """Deletes every entry in the cache"""
+        for key in list(self._entries):
+            self._remove(key)
+
+    def info(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self),
+            "nbytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
 def get_midi_from_chord(chord, name):
     mid = mido.MidiFile(type=0)
     mid.ticks_per_beat = DEFAULT_MIDI_TICKS_PER_BEAT
@@ -43,6 +472,20 @@ def get_midi_from_chord(chord, name):
     return mid
 
 
+def get_progression_tick_durations(progression, bpm, ticks_per_beat):
+    """
+    Converts the durations of a progression to ticks at `bpm` in one vectorized call.
+    Each duration is rounded on its own, like `get_midi_ticks_from_seconds`.
+    """
+    ticks = get_midi_ticks_from_seconds_array(
+        progression.get_durations_in_seconds(),
+        get_constant_tempo_changes(bpm),
+        ticks_per_beat,
+    )
+
+    return ticks.tolist()
+
+
 def get_midi_from_progression(progression, ticks_per_beat=DEFAULT_MIDI_TICKS_PER_BEAT):
     mid = mido.MidiFile(type=0)
     mid.ticks_per_beat = ticks_per_beat
@@ -56,11 +499,290 @@ def get_midi_from_progression(progression, ticks_per_beat=DEFAULT_MIDI_TICKS_PER
     track.append(mido.MetaMessage(type="set_tempo", tempo=midi_tempo))
 
     # write the chord progression
-    for c, dur in zip(progression.chords, progression.get_durations_in_seconds()):
-        tick_dur = get_midi_ticks_from_seconds(dur, progression.bpm, ticks_per_beat)
+    tick_durs = get_progression_tick_durations(
+        progression, progression.bpm, ticks_per_beat
+    )
+    for c, tick_dur in zip(progression.chords, tick_durs):
         chord = make_midi_chord(c, tick_dur)
 
         for msg in chord:
             track.append(msg)
 
     return mid
+
+
+NOTE_ON = 0x90
+NOTE_OFF = 0x80
+
+# the velocity mido gives notes by default
+DEFAULT_VELOCITY = 64
+
+# end of track meta message
+END_OF_TRACK = b"\xff\x2f\x00"
+
+
+@lru_cache(maxsize=4096)
+def encode_variable_int(value):
+    """Encodes a delta time or length as a MIDI variable length quantity, e.g. 480 -> 0x83 0x60"""
+    if value < 0:
+        raise ValueError(f"Variable length ints must be non-negative, got {value}")
+
+    encoded = [value & 0x7F]
+    value >>= 7
+
+    while value:
+        encoded.append((value & 0x7F) | 0x80)
+        value >>= 7
+
+    return bytes(reversed(encoded))
+
+
+def encode_track_name(name):
+    """A track name meta message at delta time 0, with the name encoded as latin1 like mido"""
+    name_bytes = name.encode("latin1")
+    return b"\x00\xff\x03" + encode_variable_int(len(name_bytes)) + name_bytes
+
+
+def encode_set_tempo(bpm):
+    """A set tempo meta message at delta time 0, with the bpm in microseconds per beat"""
+    return b"\x00\xff\x51\x03" + mido.bpm2tempo(bpm).to_bytes(3, "big")
+
+
+def encode_chord_events(data, midi_nums, end_tick, running_status=None):
+    """
+    Appends the events of `make_midi_chord` to the bytearray `data`: a note on for each note
+    followed by a note off for each note, `end_tick` ticks later. Status bytes are omitted
+    when they repeat the previous one. Returns the running status after the chord.
+    """
+    for ix, status in enumerate([NOTE_ON, NOTE_OFF]):
+        for jx, midi_num in enumerate(midi_nums):
+            # only the first note off is delayed
+            delta = end_tick if ix == 1 and jx == 0 else 0
+            data += encode_variable_int(delta)
+
+            if status != running_status:
+                data.append(status)
+                running_status = status
+
+            data.append(midi_num)
+            data.append(DEFAULT_VELOCITY)
+
+    return running_status
+
+
+def encode_chords_track(midi_nums_list, tick_durations, name, bpm=None):
+    """
+    Encodes chords of `midi_nums_list`, each held for its number of ticks in `tick_durations`,
+    as the events of a track named `name`, preceded by a set tempo message if `bpm` is passed.
+    """
+    track = bytearray(encode_track_name(name))
+
+    if bpm is not None:
+        track += encode_set_tempo(bpm)
+
+    running_status = None
+    for midi_nums, tick_dur in zip(midi_nums_list, tick_durations):
+        running_status = encode_chord_events(track, midi_nums, tick_dur, running_status)
+
+    track += b"\x00" + END_OF_TRACK
+
+    return bytes(track)
+
+
+def encode_smf(tracks, ticks_per_beat, smf_type=0):
+    """Wraps encoded tracks in the chunks of a Standard MIDI File"""
+    chunks = [b"MThd", struct.pack(">Lhhh", 6, smf_type, len(tracks), ticks_per_beat)]
+
+    for track in tracks:
+        chunks += [b"MTrk", struct.pack(">L", len(track)), track]
+
+    return b"".join(chunks)
+
+
+def get_smf_bytes_from_chords(
+    midi_nums_list, tick_durations, bpm, name, ticks_per_beat
+):
+    """
+    Encodes chords of `midi_nums_list`, each held for its number of ticks in `tick_durations`,
+    as the bytes of a type 0 Standard MIDI File, without building intermediate messages.
+    """
+    track = encode_chords_track(midi_nums_list, tick_durations, name, bpm)
+
+    return encode_smf([track], ticks_per_beat)
+
+
+def get_smf_bytes_from_chord(chord, name):
+    """The bytes of the file `get_midi_from_chord` saves"""
+    tick_duration = get_midi_ticks_from_seconds(
+        1, DEFAULT_BPM, DEFAULT_MIDI_TICKS_PER_BEAT
+    )
+
+    return get_smf_bytes_from_chords(
+        [chord.midi_nums],
+        [tick_duration],
+        DEFAULT_BPM,
+        name,
+        DEFAULT_MIDI_TICKS_PER_BEAT,
+    )
+
+
+def get_smf_bytes_from_progression(
+    progression, ticks_per_beat=DEFAULT_MIDI_TICKS_PER_BEAT
+):
+    """The bytes of the file `get_midi_from_progression` saves"""
+    tick_durations = get_progression_tick_durations(
+        progression, progression.bpm, ticks_per_beat
+    )
+
+    return get_smf_bytes_from_chords(
+        [c.midi_nums for c in progression.chords],
+        tick_durations,
+        progression.bpm,
+        progression.name,
+        ticks_per_beat,
+    )
+
+
+def save_midi_bytes(data, outpath=None):
+    """Writes the bytes of a MIDI file to `outpath`, or returns them if it is not passed"""
+    if not outpath:
+        return data
+
+    with open(outpath, "wb") as f:
+        f.write(data)
+
+    logger.info(f"Midi saved to {outpath}")
+
+
+def get_progression_track(progression, bpm, ticks_per_beat):
+    """
+    Encodes a progression as a track without a tempo, with ticks at `bpm`
+    so that progressions with different bpms can share a tempo map.
+    """
+    tick_durations = get_progression_tick_durations(progression, bpm, ticks_per_beat)
+
+    return encode_chords_track(
+        [c.midi_nums for c in progression.chords],
+        tick_durations,
+        progression.name,
+    )
+
+
+def save_progression_midi(progression, outpath, ticks_per_beat):
+    """Writes a progression to `outpath`, removing the partial file if the write fails"""
+    data = get_smf_bytes_from_progression(progression, ticks_per_beat)
+
+    try:
+        save_midi_bytes(data, outpath)
+    except Exception:
+        try:
+            os.remove(outpath)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def get_midi_export_filename(progression, ix):
+    """
+    The filename of the progression at index `ix`, e.g. 3 and "ii V I" -> 3_iiVI.mid
+    Spaces are removed and any other character that isn't safe in a filename on every OS is replaced with "_".
+    """
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", progression.name.replace(" ", ""))
+    return f"{ix}_{name}.mid" if name else f"{ix}.mid"
+
+
+def _run_timed(job):
+    """Runs a (func, args) job in a worker, returning its result, seconds and error message"""
+    func, args = job
+    start = time.perf_counter()
+
+    try:
+        result, error = func(*args), None
+    except Exception as e:
+        result, error = None, f"{type(e).__name__}: {e}"
+
+    return result, time.perf_counter() - start, error
+
+
+def _run_bounded(jobs, max_workers, max_in_flight):
+    """
+    Runs jobs on a process pool, submitting a new one only as one completes so that at most
+    `max_in_flight` jobs and their results are held at once. Yields (ix, (result, seconds, error)).
+    """
+    jobs = iter(enumerate(jobs))
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = {}
+
+        for ix, job in itertools.islice(jobs, max_in_flight):
+            in_flight[executor.submit(_run_timed, job)] = ix
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                yield in_flight.pop(future), future.result()
+
+            for ix, job in itertools.islice(jobs, len(done)):
+                in_flight[executor.submit(_run_timed, job)] = ix
+
+
+def export_progressions_to_midi(
+    progressions,
+    outpath,
+    multitrack=False,
+    ticks_per_beat=DEFAULT_MIDI_TICKS_PER_BEAT,
+    max_workers=None,
+    max_in_flight=None,
+):
+    """
+    Writes progressions to a directory of MIDI files at `outpath`, or with `multitrack`,
+    to a single type 1 file at `outpath` with a tempo track and one track per progression.
+
+    Progressions are encoded, and files are written, on a pool of `max_workers` processes
+    with at most `max_in_flight` progressions submitted at a time (default 4 per worker).
+    Returns a report with the name, path, seconds and error, or None, of each progression.
+    A progression that fails has no path: no file is written for it, and it is left out of the multitrack file.
+    """
+    if max_in_flight is None:
+        max_in_flight = 4 * (max_workers or os.cpu_count() or 1)
+
+    if multitrack:
+        # every track is timed against the tempo of the first progression
+        bpm = progressions[0].bpm if len(progressions) else DEFAULT_BPM
+        paths = [outpath] * len(progressions)
+        jobs = ((get_progression_track, (p, bpm, ticks_per_beat)) for p in progressions)
+    else:
+        os.makedirs(outpath, exist_ok=True)
+        paths = [
+            os.path.join(outpath, get_midi_export_filename(p, ix))
+            for ix, p in enumerate(progressions)
+        ]
+        jobs = (
+            (save_progression_midi, (p, path, ticks_per_beat))
+            for p, path in zip(progressions, paths)
+        )
+
+    report = [None] * len(progressions)
+    tracks = [None] * len(progressions)
+
+    for ix, (result, seconds, error) in _run_bounded(jobs, max_workers, max_in_flight):
+        if error:
+            logger.warning(f"Failed exporting progression {ix} to midi: {error}")
+
+        tracks[ix] = result
+        report[ix] = {
+            "name": progressions[ix].name,
+            # a failed progression has no file, and is left out of the multitrack file
+            "path": None if error else paths[ix],
+            "seconds": seconds,
+            "error": error,
+        }
+
+    if multitrack:
+        # a conductor track with the tempo of the file comes first
+        tempo_track = encode_chords_track([], [], "", bpm)
+        tracks = [tempo_track] + [t for t in tracks if t is not None]
+        save_midi_bytes(encode_smf(tracks, ticks_per_beat, smf_type=1), outpath)
+
+    return report
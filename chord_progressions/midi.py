@@ -1,4 +1,5 @@
 import mido
+import numpy as np
 from chord_progressions import DEFAULT_MIDI_TICKS_PER_BEAT
 
 
@@ -22,10 +23,110 @@ def make_midi_chord(chord, end_tick: int):
 def get_midi_ticks_from_seconds(
     seconds, bpm, ticks_per_beat=DEFAULT_MIDI_TICKS_PER_BEAT
 ):
+    # rounded to the nearest tick here, since only mido >= 1.3 rounds in `second2tick`
     midi_tempo = mido.bpm2tempo(bpm)
-    return int(mido.second2tick(seconds, ticks_per_beat, midi_tempo))
+    return int(round(seconds / (midi_tempo * 1e-6 / ticks_per_beat)))
 
 
 def get_seconds_from_midi_ticks(ticks, bpm, ticks_per_beat=DEFAULT_MIDI_TICKS_PER_BEAT):
     midi_tempo = mido.bpm2tempo(bpm)
     return mido.tick2second(ticks, ticks_per_beat, midi_tempo)
+
+
+def get_constant_tempo_changes(bpm):
+    """The tempo changes of a constant `bpm`, in the shape of `PrettyMIDI.get_tempo_changes()`"""
+    return np.array([0.0]), np.array([float(bpm)])
+
+
+def get_tempo_segments(tempo_changes, ticks_per_beat):
+    """
+    Returns the start time, start tick and seconds per tick of each constant tempo segment,
+    with the tempo rounded to whole microseconds per beat like `mido.bpm2tempo`.
+    """
+    times, bpms = (np.asarray(a, dtype=float) for a in tempo_changes)
+
+    midi_tempos = np.round(60 * 1e6 / bpms)
+    scales = midi_tempos * 1e-6 / ticks_per_beat
+
+    start_ticks = np.zeros(len(times))
+    start_ticks[1:] = np.cumsum(np.diff(times) / scales[:-1])
+
+    return times, start_ticks, scales
+
+
+def get_midi_ticks_from_seconds_array(
+    seconds, tempo_changes, ticks_per_beat=DEFAULT_MIDI_TICKS_PER_BEAT
+):
+    """
+    Converts an array of times in seconds to ticks against tempo changes in the shape of
+    `PrettyMIDI.get_tempo_changes()`. With a constant tempo, each value is the same as
+    `get_midi_ticks_from_seconds`, so durations can be converted with `get_constant_tempo_changes(bpm)`.
+    """
+    times, start_ticks, scales = get_tempo_segments(tempo_changes, ticks_per_beat)
+    seconds = np.asarray(seconds, dtype=float)
+
+    ixs = np.maximum(np.searchsorted(times, seconds, side="right") - 1, 0)
+    ticks = start_ticks[ixs] + (seconds - times[ixs]) / scales[ixs]
+
+    return np.round(ticks).astype(np.int64)
+
+
+def get_seconds_from_midi_ticks_array(
+    ticks, tempo_changes, ticks_per_beat=DEFAULT_MIDI_TICKS_PER_BEAT
+):
+    """
+    Converts an array of ticks to times in seconds against tempo changes in the shape of
+    `PrettyMIDI.get_tempo_changes()`. With a constant tempo, each value is the same as `get_seconds_from_midi_ticks`.
+    """
+    times, start_ticks, scales = get_tempo_segments(tempo_changes, ticks_per_beat)
+    ticks = np.asarray(ticks)
+
+    ixs = np.maximum(np.searchsorted(start_ticks, ticks, side="right") - 1, 0)
+
+    return times[ixs] + (ticks - start_ticks[ixs]) * scales[ixs]
+
+
+def get_warp_segments(tempo_changes, bpm):
+    """Returns the start time, warped start time and rate of each constant tempo segment, relative to `bpm`"""
+    times, bpms = (np.asarray(a, dtype=float) for a in tempo_changes)
+
+    rates = bpms / bpm
+
+    warped_times = np.zeros(len(times))
+    warped_times[1:] = np.cumsum(np.diff(times) * rates[:-1])
+
+    return times, warped_times, rates
+
+
+def warp_seconds_to_bpm(seconds, tempo_changes, bpm):
+    """
+    Converts an array of times in seconds against tempo changes in the shape of `PrettyMIDI.get_tempo_changes()`
+    to the times they would have at a constant `bpm`. Times are unchanged if the tempo is constantly `bpm`.
+    """
+    times, warped_times, rates = get_warp_segments(tempo_changes, bpm)
+    seconds = np.asarray(seconds, dtype=float)
+
+    ixs = np.maximum(np.searchsorted(times, seconds, side="right") - 1, 0)
+
+    return warped_times[ixs] + (seconds - times[ixs]) * rates[ixs]
+
+
+def unwarp_seconds_from_bpm(seconds, tempo_changes, bpm):
+    """The inverse of `warp_seconds_to_bpm`"""
+    times, warped_times, rates = get_warp_segments(tempo_changes, bpm)
+    seconds = np.asarray(seconds, dtype=float)
+
+    ixs = np.maximum(np.searchsorted(warped_times, seconds, side="right") - 1, 0)
+
+    return times[ixs] + (seconds - warped_times[ixs]) / rates[ixs]
+
+
+def get_beats_from_seconds(seconds, tempo_changes):
+    """Converts an array of times in seconds to beats against tempo changes in the shape of `PrettyMIDI.get_tempo_changes()`"""
+    # at 60 bpm, a beat lasts one second
+    return warp_seconds_to_bpm(seconds, tempo_changes, 60)
+
+
+def get_seconds_from_beats(beats, tempo_changes):
+    """Converts an array of beats to times in seconds against tempo changes in the shape of `PrettyMIDI.get_tempo_changes()`"""
+    return unwarp_seconds_from_bpm(beats, tempo_changes, 60)
@@ -1,3 +1,5 @@
+import numpy as np
+
 A4 = 440
 
 
@@ -270,6 +272,12 @@ MIDI_NOTE_FREQUENCIES = [
 ]
 
 
+MIDI_NUMS_BY_NOTE = {note: ix for ix, note in enumerate(MIDI_NOTES)}
+
+MIDI_NOTES_ARRAY = np.array(MIDI_NOTES)
+MIDI_NOTE_FREQUENCIES_ARRAY = np.array(MIDI_NOTE_FREQUENCIES)
+
+
 def get_note_from_midi_num(note_num):
     try:
         return MIDI_NOTES[int(note_num)]
@@ -279,8 +287,8 @@ def get_note_from_midi_num(note_num):
 
 def get_midi_num_from_note(note):
     try:
-        return MIDI_NOTES.index(note)
-    except ValueError:
+        return MIDI_NUMS_BY_NOTE[note]
+    except (KeyError, TypeError):
         raise ValueError(f"Invalid note name: {note}")
 
 
@@ -388,6 +396,40 @@ def get_freq_from_note(note):
     return MIDI_NOTE_FREQUENCIES[ix]
 
 
+def get_midi_nums_from_notes(notes):
+    """Converts an array of notes of any shape to an array of midi numbers, e.g. ["C4", "A4"] -> [60, 69]"""
+    notes = np.asarray(notes)
+
+    if notes.size == 0:
+        return np.zeros(notes.shape, dtype=int)
+
+    # look up each distinct note once and scatter the results back
+    unique_notes, inverse = np.unique(notes, return_inverse=True)
+    unique_midi_nums = np.array([get_midi_num_from_note(n) for n in unique_notes])
+
+    return unique_midi_nums[inverse].reshape(notes.shape)
+
+
+def _check_midi_nums(midi_nums):
+    midi_nums = np.asarray(midi_nums, dtype=int)
+
+    invalid = (midi_nums < 0) | (midi_nums >= len(MIDI_NOTES))
+    if invalid.any():
+        raise IndexError(f"Invalid midi note number: {midi_nums[invalid][0]}")
+
+    return midi_nums
+
+
+def get_notes_from_midi_nums(midi_nums):
+    """Converts an array of midi numbers of any shape to an array of notes, e.g. [60, 69] -> ["C4", "A4"]"""
+    return MIDI_NOTES_ARRAY[_check_midi_nums(midi_nums)]
+
+
+def get_freqs_from_midi_nums(midi_nums):
+    """Converts an array of midi numbers of any shape to an array of frequencies, e.g. [60, 69] -> [261.63, 440.0]"""
+    return MIDI_NOTE_FREQUENCIES_ARRAY[_check_midi_nums(midi_nums)]
+
+
 def get_n_overtones_harmonic(freq, n):
     """Compute a list of n overtones above a given freq"""
     return [i * freq for i in range(1, n + 2)]
@@ -0,0 +1,186 @@
+from chord_progressions.pitch import (
+    get_midi_num_from_note,
+    get_pitch_class_from_midi_num,
+)
+
+
+def get_mask_from_pitch_classes(pcs):
+    """e.g. [0, 4, 7] -> 0b000010010001 (bit `i` is set when pitch class `i` is present)"""
+    if isinstance(pcs, PitchClassSet):
+        return pcs.mask
+
+    mask = 0
+
+    for pc in pcs:
+        mask |= 1 << pc
+
+    return mask
+
+
+def get_mask_from_template_str(template_str):
+    """e.g. "100010010000" -> 0b000010010001"""
+    return get_mask_from_pitch_classes(
+        [ix for ix, i in enumerate(template_str) if i == "1"]
+    )
+
+
+def rotate_mask(mask, n=1):
+    """Transposes a 12-bit pitch class mask up by `n` semitones"""
+    n %= 12
+    return ((mask << n) | (mask >> (12 - n))) & 0xFFF
+
+
+def invert_mask(mask):
+    """Inverts a 12-bit pitch class mask around pitch class 0, i.e. pc -> (12 - pc) % 12"""
+    return INVERTED_MASKS[mask]
+
+
+def get_mask_cardinality(mask):
+    """The number of pitch classes in a 12-bit pitch class mask"""
+    return CARDINALITY_BY_MASK[mask]
+
+
+class PitchClassSet:
+    """An immutable set of pitch classes backed by a 12-bit mask.
+
+    Bit `i` of the mask is set when pitch class `i` is present, so the set can be used
+    directly as an index into tables with 4096 entries.
+
+    Parameters
+    ----------
+    pcs: iterable[int], default ()
+        The pitch classes in the set.
+            e.g. PitchClassSet([0, 4, 7])
+    """
+
+    __slots__ = ("mask",)
+
+    def __init__(self, pcs=()):
+        object.__setattr__(self, "mask", get_mask_from_pitch_classes(pcs))
+
+    @classmethod
+    def from_mask(cls, mask):
+        """e.g. PitchClassSet.from_mask(0b000010010001) -> PitchClassSet([0, 4, 7])"""
+        if not 0 <= mask < 4096:
+            raise ValueError(f"Invalid pitch class mask: {mask}")
+
+        pcs = cls.__new__(cls)
+        object.__setattr__(pcs, "mask", int(mask))
+        return pcs
+
+    @classmethod
+    def from_midi_nums(cls, midi_nums):
+        """e.g. [48, 52, 67] -> PitchClassSet([0, 4, 7])"""
+        return cls([get_pitch_class_from_midi_num(n) for n in midi_nums])
+
+    @classmethod
+    def from_notes(cls, notes):
+        """e.g. ["C3", "E3", "G4"] -> PitchClassSet([0, 4, 7])"""
+        return cls(
+            [get_pitch_class_from_midi_num(get_midi_num_from_note(n)) for n in notes]
+        )
+
+    @classmethod
+    def from_template(cls, template):
+        """e.g. [1, 0, 0, 0, 1, 0, 0, 1, 0, 0, 0, 0] -> PitchClassSet([0, 4, 7])"""
+        return cls([ix for ix, i in enumerate(template) if i])
+
+    @classmethod
+    def from_template_str(cls, template_str):
+        """e.g. "100010010000" -> PitchClassSet([0, 4, 7])"""
+        return cls.from_mask(get_mask_from_template_str(template_str))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("PitchClassSet is immutable")
+
+    def __reduce__(self):
+        return (PitchClassSet.from_mask, (self.mask,))
+
+    @property
+    def template(self):
+        """e.g. PitchClassSet([0, 4, 7]) -> [1, 0, 0, 0, 1, 0, 0, 1, 0, 0, 0, 0]"""
+        return [(self.mask >> i) & 1 for i in range(12)]
+
+    @property
+    def template_str(self):
+        """e.g. PitchClassSet([0, 4, 7]) -> '100010010000'"""
+        return "".join(str(i) for i in self.template)
+
+    @property
+    def cardinality(self):
+        return CARDINALITY_BY_MASK[self.mask]
+
+    def rotate(self, n=1):
+        """Rotates the template `n` steps to the right, i.e. transposes up by `n` semitones"""
+        return PitchClassSet.from_mask(rotate_mask(self.mask, n))
+
+    def transpose(self, n):
+        """Transposes every pitch class up by `n` semitones. Same as `rotate(n)`."""
+        return self.rotate(n)
+
+    def invert(self, axis=0):
+        """Inverts every pitch class around `axis`, i.e. pc -> (axis - pc) % 12"""
+        return PitchClassSet.from_mask(rotate_mask(INVERTED_MASKS[self.mask], axis))
+
+    def get_rotations(self):
+        """Returns the distinct rotations of the set, starting with the set itself"""
+        rotations = []
+
+        for n in range(12):
+            rotated = self.rotate(n)
+            if rotated not in rotations:
+                rotations.append(rotated)
+
+        return rotations
+
+    def issubset(self, other):
+        return self.mask & ~other.mask == 0
+
+    def issuperset(self, other):
+        return other.mask & ~self.mask == 0
+
+    def __le__(self, other):
+        return self.issubset(other)
+
+    def __ge__(self, other):
+        return self.issuperset(other)
+
+    def __or__(self, other):
+        return PitchClassSet.from_mask(self.mask | other.mask)
+
+    def __and__(self, other):
+        return PitchClassSet.from_mask(self.mask & other.mask)
+
+    def __contains__(self, pc):
+        return bool((self.mask >> (pc % 12)) & 1)
+
+    def __iter__(self):
+        for pc in range(12):
+            if (self.mask >> pc) & 1:
+                yield pc
+
+    def __len__(self):
+        return self.cardinality
+
+    def __index__(self):
+        return self.mask
+
+    def __eq__(self, other):
+        if isinstance(other, PitchClassSet):
+            return self.mask == other.mask
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.mask)
+
+    def __repr__(self):
+        return f"PitchClassSet({list(self)})"
+
+
+# Computed once at import for each of the 4096 pitch class sets
+INVERTED_MASKS = [
+    get_mask_from_pitch_classes([(12 - pc) % 12 for pc in range(12) if m >> pc & 1])
+    for m in range(4096)
+]
+
+CARDINALITY_BY_MASK = [bin(m).count("1") for m in range(4096)]
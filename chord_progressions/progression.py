@@ -1,9 +1,22 @@
 import json
 
+import numpy as np
 from chord_progressions import DEFAULT_BPM, logger
-from chord_progressions.chord import Chord
-from chord_progressions.io.audio import make_audio_progression, save_audio_buffer
-from chord_progressions.io.midi import get_midi_from_progression
+from chord_progressions.chord import Chord, thaw_metrics
+from chord_progressions.io.audio import (
+    BLOCK_SIZE,
+    DEFAULT_ARPEGGIO_SEQS,
+    get_quality_settings,
+    iter_arpeggiated_audio_progression,
+    iter_audio_progression,
+    make_audio_progression,
+    save_audio_blocks,
+)
+from chord_progressions.io.midi import (
+    get_midi_from_progression,
+    get_smf_bytes_from_progression,
+    save_midi_bytes,
+)
 
 """
     Durations are specified in Tone.Time.Notation format.
@@ -134,9 +147,9 @@ class Progression:
                     "duration": duration,
                     "type": chord.type,
                     "typeId": chord.typeId,
-                    "notes": chord.notes,
+                    "notes": list(chord.notes),
                     "midi_nums": chord.midi_nums,
-                    "metrics": chord.metrics,
+                    "metrics": thaw_metrics(chord.metrics),
                 }
             )
 
@@ -145,18 +158,60 @@ class Progression:
     def get_durations_in_seconds(self):
         return [duration_to_seconds(d, self.bpm) for d in self.durations]
 
-    def to_audio(self, outpath=None, n_overtones=4):
+    def to_audio(
+        self,
+        outpath=None,
+        n_overtones=4,
+        block_size=BLOCK_SIZE,
+        quality="high",
+        arpeggiate=False,
+        seqs=DEFAULT_ARPEGGIO_SEQS,
+        rng=None,
+    ):
+        """
+        Renders the progression to a float32 buffer, or streams it to a WAV file at `outpath`
+        in blocks of `block_size` samples so that memory use does not grow with its length.
+        `quality` is one of `QUALITIES`; "preview" trades accuracy for rendering speed.
+        With `arpeggiate`, each note plays a rhythm from `seqs` chosen by the `numpy.random.Generator` `rng`.
+        """
         dur_secs = self.get_durations_in_seconds()
-        audio_buffer = make_audio_progression(self.chords, dur_secs, n_overtones)
+
+        if arpeggiate:
+            blocks = iter_arpeggiated_audio_progression(
+                self.chords, dur_secs, n_overtones, seqs, rng, quality
+            )
+        else:
+            blocks = iter_audio_progression(
+                self.chords, dur_secs, n_overtones, block_size, quality
+            )
 
         # TODO: create outpath from datetime if not provided? add flag to opt for this?
         if outpath:
-            save_audio_buffer(audio_buffer, outpath)
+            sample_rate = get_quality_settings(quality)["sample_rate"]
+            save_audio_blocks(blocks, outpath, sample_rate)
             logger.info(f"Audio saved to {outpath}")
+        elif arpeggiate:
+            return np.concatenate(list(blocks))
+        else:
+            return make_audio_progression(
+                self.chords, dur_secs, n_overtones, quality=quality
+            )
+
+    def to_midi(self, outpath=None, backend="mido"):
+        """
+        Converts the progression to a mido.MidiFile, or with the "bytes" backend,
+        encodes the same file directly to bytes. Saves it to `outpath` if passed.
+        """
+        if backend == "bytes":
+            data = get_smf_bytes_from_progression(self)
+            return save_midi_bytes(data, outpath)
+        elif backend != "mido":
+            raise ValueError(f"Unknown midi backend: {backend}")
 
-    def to_midi(self, outpath=None):
         mid = get_midi_from_progression(self)
         if outpath:
             mid.filename = outpath
             mid.save(outpath)
             logger.info(f"Midi saved to {outpath}")
+        else:
+            return mid
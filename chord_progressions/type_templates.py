@@ -1,9 +1,13 @@
 from chord_progressions import logger
 from chord_progressions.pitch import (
-    get_note_from_midi_num,
     get_pitch_class_from_midi_num,
     get_pitch_class_from_note,
 )
+from chord_progressions.pitch_class_set import (
+    PitchClassSet,
+    get_mask_from_template_str,
+    rotate_mask,
+)
 from chord_progressions.utils import is_circular_match
 
 """
@@ -227,8 +231,35 @@ TYPE_TEMPLATES = {
 }
 
 
+def _build_type_lookup():
+    """
+    Maps every possible 12-bit pitch class mask to the first entry of TYPE_TEMPLATES
+    that matches any of its rotations. Unmatched masks map to "".
+    """
+    type_names = [""] * 4096
+
+    for chord_type, template_str in TYPE_TEMPLATES.items():
+        if not template_str:
+            continue
+
+        mask = get_mask_from_template_str(template_str)
+
+        for n in range(12):
+            rotated = rotate_mask(mask, n)
+            if not type_names[rotated]:
+                type_names[rotated] = chord_type
+
+    nums_by_type = {t: ix for ix, t in enumerate(TYPE_TEMPLATES) if t}
+    type_nums = [nums_by_type.get(t) for t in type_names]
+
+    return type_names, type_nums
+
+
 def get_template_from_pitch_classes(pcs):
     """e.g. [0, 4, 7] -> [1, 0, 0, 0, 1, 0, 0, 1, 0, 0, 0, 0]"""
+    if isinstance(pcs, PitchClassSet):
+        return pcs.template
+
     template = [0] * 12
 
     for ix in pcs:
@@ -250,6 +281,9 @@ def get_template_from_template_str(template_str):
 
 
 def get_type_from_template(template):
+    if isinstance(template, PitchClassSet):
+        return get_type_from_mask(template) or None
+
     for chord_type in list(TYPE_TEMPLATES):
         if is_circular_match(
             template,
@@ -287,10 +321,28 @@ def get_type_num_from_type(chord_type):
 
 def notes_match_chord_type(notes, chord_type):
     """Returns true if any rotation of `notes` fit `chord_type`"""
-    return is_circular_match(
-        get_template_from_notes(notes),
-        get_template_from_template_str(TYPE_TEMPLATES[chord_type]),
-    )
+    pcs = PitchClassSet.from_notes(notes)
+    template_pcs = PitchClassSet.from_template_str(TYPE_TEMPLATES[chord_type])
+
+    if not template_pcs:
+        return False
+
+    return template_pcs in pcs.get_rotations()
+
+
+def get_type_from_mask(mask):
+    """
+    Returns the first exact template match for a 12-bit pitch class mask or a PitchClassSet.
+    Returns "" if no match.
+    e.g. 0b000010010001 -> "major chord"
+    """
+    return TYPE_NAMES_BY_MASK[mask]
+
+
+def get_type_num_from_mask(mask):
+    """Returns the id of the chord type matching a 12-bit pitch class mask or a PitchClassSet.
+    Returns None if no match."""
+    return TYPE_NUMS_BY_MASK[mask]
 
 
 def get_type_from_notes(notes):
@@ -300,12 +352,12 @@ def get_type_from_notes(notes):
 
     TODO: find partial matches as well
     """
-    for chord_type in list(TYPE_TEMPLATES):
-        if notes_match_chord_type(notes, chord_type):
-            return chord_type
+    chord_type = get_type_from_mask(PitchClassSet.from_notes(notes))
 
-    logger.debug(f"No type template matched chord: {notes}")
-    return ""
+    if not chord_type:
+        logger.debug(f"No type template matched chord: {notes}")
+
+    return chord_type
 
 
 def get_type_from_midi_nums(midi_nums):
@@ -313,8 +365,16 @@ def get_type_from_midi_nums(midi_nums):
     Returns the first exact template match
     e.g. [48, 60] -> "unison"
     """
-    notes = [get_note_from_midi_num(n) for n in midi_nums]
-    return get_type_from_notes(notes)
+    midi_nums = [int(n) for n in midi_nums]
+    if any(n < 0 or n > 127 for n in midi_nums):
+        raise IndexError(f"Invalid midi note numbers: {midi_nums}")
+
+    chord_type = get_type_from_mask(PitchClassSet.from_midi_nums(midi_nums))
+
+    if not chord_type:
+        logger.debug(f"No type template matched chord: {midi_nums}")
+
+    return chord_type
 
 
 def get_template_from_notes(notes):
@@ -322,3 +382,7 @@ def get_template_from_notes(notes):
     pitch_classes = [get_pitch_class_from_note(n) for n in notes]
 
     return get_template_from_pitch_classes(pitch_classes)
+
+
+# Computed once at import: chord type name and id for each of the 4096 pitch class sets
+TYPE_NAMES_BY_MASK, TYPE_NUMS_BY_MASK = _build_type_lookup()
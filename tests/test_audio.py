@@ -0,0 +1,260 @@
+import chord_progressions.io.audio
+import numpy as np
+import pytest
+from chord_progressions.chord import Chord
+from chord_progressions.io.audio import (
+    QUALITIES,
+    SAMPLE_RATE,
+    BufferCache,
+    get_arpeggio_gates,
+    get_partials,
+    iter_audio_progression,
+    make_audio_progression,
+    make_audio_progression_parallel,
+    make_audio_progressions_parallel,
+    mk_additive_buffer,
+    mk_arpeggiated_chord_buffer,
+    mk_chord_buffer,
+    mk_note_buffer,
+    mk_sin,
+    mk_wavetable_buffer,
+    save_audio_blocks,
+    save_audio_buffer,
+)
+from chord_progressions.pitch import get_freq_from_note
+from chord_progressions.progression import Progression
+from scipy.io import wavfile
+
+C_MAJOR = ["C4", "E4", "G4"]
+
+
+def test_mk_sin():
+    buf = mk_sin(441, 0.01, 0.5)
+
+    assert buf.shape == (441, 1)
+    assert np.isclose(buf.max(), 0.5)
+    assert np.isclose(buf[25, 0], 0.5)
+
+
+def test_mk_additive_buffer():
+    freqs, amps = [441, 882], [0.5, 0.25]
+    buf = mk_additive_buffer(freqs, amps, 100)
+
+    expected = mk_sin(441, 100 / SAMPLE_RATE, 0.5) + mk_sin(
+        882, 100 / SAMPLE_RATE, 0.25
+    )
+    assert np.allclose(buf, expected.ravel())
+
+    # rendering in parts gives the same samples
+    parts = [
+        mk_additive_buffer(freqs, amps, 60),
+        mk_additive_buffer(freqs, amps, 40, 60),
+    ]
+    assert np.allclose(np.concatenate(parts), buf)
+
+
+def test_mk_chord_buffer():
+    duration, n_overtones = 0.1, 3
+    buf = mk_chord_buffer(C_MAJOR, duration, n_overtones)
+
+    note_bufs = [mk_note_buffer(n, duration, n_overtones) for n in C_MAJOR]
+    expected = np.hstack(note_bufs).sum(axis=1) / len(C_MAJOR)
+
+    assert buf.dtype == np.float32
+    assert buf.shape == (int(duration * SAMPLE_RATE),)
+    assert np.allclose(buf, expected, atol=1e-6)
+
+    assert not mk_chord_buffer([], duration, n_overtones).any()
+
+
+def test_mk_chord_buffer_blocks(monkeypatch):
+    expected = mk_chord_buffer(C_MAJOR, 0.1, 3)
+
+    # a buffer spanning several blocks, the last one partial, has the same samples
+    monkeypatch.setattr(chord_progressions.io.audio, "BLOCK_SIZE", 1000)
+    assert np.array_equal(mk_chord_buffer(C_MAJOR, 0.1, 3), expected)
+
+
+def test_mk_note_buffer():
+    buf = mk_note_buffer("A4", 0.1, 0)
+    assert np.allclose(buf, mk_sin(get_freq_from_note("A4"), 0.1, 1))
+
+
+def test_make_audio_progression():
+    chords = [Chord(C_MAJOR), Chord(["A3", "C4", "E4"])]
+    buf = make_audio_progression(chords, [0.1, 0.2], 2)
+
+    assert buf.shape == (int(0.1 * SAMPLE_RATE) + int(0.2 * SAMPLE_RATE),)
+
+
+def test_iter_audio_progression():
+    chords = [Chord(C_MAJOR), Chord([]), Chord(["A3", "C4", "E4"])]
+    durations = [0.1, 0.05, 0.2]
+
+    blocks = list(iter_audio_progression(chords, durations, 2, block_size=1000))
+    assert all(b.dtype == np.float32 and len(b) <= 1000 for b in blocks)
+
+    expected = make_audio_progression(chords, durations, 2)
+    assert np.allclose(np.concatenate(blocks), expected, atol=1e-6)
+
+
+def test_save_audio_blocks(tmp_path):
+    chords = [Chord(C_MAJOR), Chord(["A3", "C4", "E4"])]
+    durations = [0.1, 0.2]
+    buf = make_audio_progression(chords, durations, 2)
+
+    save_audio_buffer(buf, tmp_path / "buffer.wav")
+    save_audio_blocks(np.array_split(buf, 7), tmp_path / "blocks.wav")
+
+    assert (tmp_path / "buffer.wav").read_bytes() == (
+        tmp_path / "blocks.wav"
+    ).read_bytes()
+
+    rate, data = wavfile.read(tmp_path / "blocks.wav")
+    assert rate == SAMPLE_RATE
+    assert np.array_equal(data, buf)
+
+
+def test_buffer_cache():
+    cache = BufferCache(max_bytes=3 * 4000)
+
+    first = mk_chord_buffer(C_MAJOR, 1000 / SAMPLE_RATE, 2, cache)
+    second = mk_chord_buffer(C_MAJOR, 1000 / SAMPLE_RATE, 2, cache)
+    assert first is second
+    assert not first.flags.writeable
+    assert (cache.hits, cache.misses, cache.nbytes) == (1, 1, 4000)
+
+    for note in ["C4", "D4", "E4"]:
+        mk_chord_buffer([note], 1000 / SAMPLE_RATE, 2, cache)
+
+    assert cache.evictions == 1
+    assert cache.nbytes <= cache.max_bytes
+    assert (
+        "chord",
+        tuple(C_MAJOR),
+        1000 / SAMPLE_RATE,
+        2,
+        SAMPLE_RATE,
+        "sine",
+    ) not in cache
+
+    note_buf = mk_note_buffer("A4", 0.01, 1, cache)
+    assert mk_note_buffer("A4", 0.01, 1, cache) is note_buf
+
+    cache.clear()
+    assert len(cache) == 0 and cache.nbytes == 0
+
+
+def test_make_audio_progression_reuses_buffers():
+    cache = BufferCache()
+    chords = [Chord(C_MAJOR), Chord(["A3", "C4", "E4"])] * 4
+
+    buf = make_audio_progression(chords, [0.05] * 8, 2, cache)
+    assert (cache.hits, cache.misses) == (6, 2)
+    assert np.array_equal(buf, make_audio_progression(chords, [0.05] * 8, 2, None))
+
+
+def test_mk_wavetable_buffer():
+    freqs = [get_freq_from_note(n) for n in C_MAJOR]
+    partial_freqs, partial_amps = get_partials(freqs, 3)
+
+    expected = mk_additive_buffer(partial_freqs, partial_amps / 3, 5000, 100)
+    buf = mk_wavetable_buffer(freqs, 3, 5000, 100)
+
+    assert np.allclose(buf, expected, atol=1e-5)
+
+
+@pytest.mark.parametrize("quality", list(QUALITIES))
+def test_mk_chord_buffer_quality(quality):
+    buf = mk_chord_buffer(C_MAJOR, 0.1, 2, quality=quality)
+    assert buf.dtype == np.float32
+    assert buf.shape == (int(0.1 * QUALITIES[quality]["sample_rate"]),)
+
+    blocks = iter_audio_progression([Chord(C_MAJOR)], [0.1], 2, 1000, quality)
+    assert np.array_equal(np.concatenate(list(blocks)), buf)
+
+
+def test_mk_chord_buffer_unknown_quality():
+    with pytest.raises(ValueError):
+        mk_chord_buffer(C_MAJOR, 0.1, 2, quality="ultra")
+
+
+def test_chord_to_audio_preview(tmp_path):
+    Chord(C_MAJOR).to_audio(tmp_path / "preview.wav", quality="preview")
+
+    rate, data = wavfile.read(tmp_path / "preview.wav")
+    assert rate == QUALITIES["preview"]["sample_rate"]
+    assert len(data) == rate
+
+
+def test_make_audio_progression_parallel():
+    chords = [Chord(C_MAJOR), Chord(["A3", "C4", "E4"]), Chord(C_MAJOR)]
+    durations = [0.05, 0.1, 0.05]
+
+    buf = make_audio_progression_parallel(chords, durations, 2, max_workers=2)
+    assert np.array_equal(buf, make_audio_progression(chords, durations, 2, None))
+
+    progressions = [(chords, durations), (chords[::-1], durations[::-1])]
+    bufs = make_audio_progressions_parallel(progressions, 2, max_workers=2)
+
+    assert len(bufs) == 2
+    for buf, (p_chords, p_durations) in zip(bufs, progressions):
+        expected = make_audio_progression(p_chords, p_durations, 2, None)
+        assert np.array_equal(buf, expected)
+
+
+def test_get_arpeggio_gates():
+    gates = get_arpeggio_gates([[1, 0], [0, 1, 1, 0]], 8)
+
+    assert gates.tolist() == [
+        [1, 0],
+        [1, 0],
+        [1, 1],
+        [1, 1],
+        [0, 1],
+        [0, 1],
+        [0, 0],
+        [0, 0],
+    ]
+
+    assert (
+        get_arpeggio_gates([[1, 0], [0, 1, 1, 0]], 8, 3, 4).tolist()
+        == gates[3:7].tolist()
+    )
+
+
+def test_mk_arpeggiated_chord_buffer():
+    seqs = [[1, 0], [0, 1]]
+
+    buf = mk_arpeggiated_chord_buffer(C_MAJOR, 0.1, seqs, 2, np.random.default_rng(0))
+    same = mk_arpeggiated_chord_buffer(C_MAJOR, 0.1, seqs, 2, np.random.default_rng(0))
+
+    assert buf.dtype == np.float32
+    assert buf.shape == (int(0.1 * SAMPLE_RATE),)
+    assert np.array_equal(buf, same)
+
+    # with every note on throughout, an arpeggio is the chord itself
+    held = mk_arpeggiated_chord_buffer(C_MAJOR, 0.1, [[1]], 2)
+    assert np.allclose(held, mk_chord_buffer(C_MAJOR, 0.1, 2), atol=1e-6)
+
+
+def test_mk_arpeggiated_chord_buffer_blocks(monkeypatch):
+    seqs = [[1, 0, 1], [0, 1]]
+    expected = mk_arpeggiated_chord_buffer(
+        C_MAJOR, 0.1, seqs, 2, np.random.default_rng(0)
+    )
+
+    monkeypatch.setattr(chord_progressions.io.audio, "BLOCK_SIZE", 1000)
+    buf = mk_arpeggiated_chord_buffer(C_MAJOR, 0.1, seqs, 2, np.random.default_rng(0))
+
+    assert np.array_equal(buf, expected)
+
+
+def test_progression_to_audio_arpeggiate():
+    progression = Progression([Chord(C_MAJOR), Chord(["A3", "C4", "E4"])], bpm=120)
+
+    buf = progression.to_audio(arpeggiate=True, rng=np.random.default_rng(1))
+    same = progression.to_audio(arpeggiate=True, rng=np.random.default_rng(1))
+
+    assert np.array_equal(buf, same)
+    assert buf.shape == progression.to_audio().shape
@@ -1,5 +1,12 @@
+import numpy as np
 import pytest
-from chord_progressions.chord import Chord
+from chord_progressions.chord import (
+    Chord,
+    ChordBatch,
+    disable_chord_interning,
+    enable_chord_interning,
+    get_chord_interning_info,
+)
 
 
 def test_instantiate_chord():
@@ -13,3 +20,99 @@ def test_instantiate_chord():
 
     cd = Chord(["C4", "E4", "G4"], 2)
     assert cd.midi_nums == [60, 64, 67]
+
+
+def test_chord_batch_matches_chord():
+    midi_nums_list = [[60, 64, 67], [48, 60, 48], [], [127, 0, 5, 7, 11, 3], [61]]
+
+    batch = ChordBatch(midi_nums_list)
+    assert len(batch) == len(midi_nums_list)
+
+    for ix, midi_nums in enumerate(midi_nums_list):
+        expected = Chord(midi_nums, id=batch.ids[ix]).to_json()
+        assert batch.row_to_json(ix) == expected
+
+
+def test_chord_batch_padded():
+    batch = ChordBatch(np.array([[67, 60, 64], [60, 64, -1]]))
+
+    assert batch.get_midi_nums(0) == [60, 64, 67]
+    assert batch.get_midi_nums(1) == [60, 64]
+    assert batch.types == ["major chord", "major third"]
+    assert batch.metrics["ambitus"].tolist() == [7, 4]
+
+    with pytest.raises(ValueError):
+        ChordBatch([[60, 128]])
+
+
+def test_chord_batch_empty():
+    batch = ChordBatch([])
+
+    assert len(batch) == 0
+    assert batch.types == []
+    assert batch.metrics["overtone_agreement"].tolist() == []
+
+
+def test_chord_is_lazy():
+    c = Chord([60, 64, 67])
+    assert not hasattr(c, "__dict__")
+    assert c._metrics is None
+
+    assert c.type == "major chord"
+    assert c.metrics["pc_cardinality"] == 3
+    assert c._metrics is not None
+
+
+def test_chord_ids():
+    assert len(Chord([60]).id) == 36
+    assert Chord([60], id="a").id == "a"
+
+    first, second = Chord([60], id_type="counter"), Chord([60], id_type="counter")
+    assert int(second.id) == int(first.id) + 1
+
+    assert (
+        Chord([60, 64], id_type="content").id == Chord([64, 60], id_type="content").id
+    )
+    assert Chord([60], id_type="content").id != Chord([61], id_type="content").id
+
+    with pytest.raises(ValueError):
+        Chord([60], id_type="random")
+
+
+def test_chord_interning():
+    assert get_chord_interning_info() is None
+
+    enable_chord_interning(maxsize=2)
+    try:
+        first, second = Chord([60, 64, 67]), Chord([67, 64, 60])
+        assert first.notes is second.notes
+        assert first.metrics is second.metrics
+        assert first.id != second.id
+        assert first.to_json()["type"] == "major chord"
+
+        # the shared analysis is read-only, and json rows are copies of it
+        with pytest.raises(TypeError):
+            first.metrics["ambitus"] = 0
+        assert first.metrics["interval_class_vector"] == (0, 0, 1, 1, 1, 0)
+
+        row = first.to_json()
+        row["notes"].append("C5")
+        row["metrics"]["interval_class_vector"][0] = 1
+        assert second.to_json()["notes"] == ["C4", "E4", "G4"]
+        assert second.to_json()["metrics"]["interval_class_vector"] == [
+            0,
+            0,
+            1,
+            1,
+            1,
+            0,
+        ]
+
+        Chord([61])
+        Chord([62])
+        info = get_chord_interning_info()
+        assert (info.hits, info.misses, info.currsize) == (1, 3, 2)
+    finally:
+        disable_chord_interning()
+
+    assert Chord([60, 64, 67]).metrics is not Chord([60, 64, 67]).metrics
@@ -1,4 +1,20 @@
-from chord_progressions.evaluate import get_evenness, get_interval_class_vector
+import numpy as np
+from chord_progressions.evaluate import (
+    PC_SET_METRICS,
+    evaluate_notes,
+    evaluate_pitch_class_set,
+    get_evenness,
+    get_evenness_values,
+    get_interval_class_vector,
+    get_interval_class_vectors,
+    get_max_evenness,
+    get_min_evenness,
+    get_overtone_agreement,
+    get_overtone_agreements,
+    get_relative_evenness,
+)
+from chord_progressions.pitch import get_freq_from_note, get_n_overtones_harmonic
+from chord_progressions.pitch_class_set import PitchClassSet
 
 EXPECTATIONS = [
     {"notes": ["C4"], "icv": [0, 0, 0, 0, 0, 0], "evenness": 0},  # unison
@@ -41,3 +57,99 @@ def test_get_evenness():
 
     for ex in EXPECTATIONS:
         assert get_evenness(ex["icv"]) - ex["evenness"] < tolerance
+
+
+def test_get_interval_class_vector_from_pitch_class_set():
+    for ex in EXPECTATIONS:
+        pcs = PitchClassSet.from_notes(ex["notes"])
+        assert get_interval_class_vector(pcs) == ex["icv"]
+
+
+def test_get_interval_class_vectors():
+    pcs = [PitchClassSet.from_notes(ex["notes"]) for ex in EXPECTATIONS]
+    expected = [ex["icv"] for ex in EXPECTATIONS]
+
+    assert get_interval_class_vectors([p.mask for p in pcs]).tolist() == expected
+    assert get_interval_class_vectors([p.template for p in pcs]).tolist() == expected
+
+    masks = np.arange(4096)
+    vecs = get_interval_class_vectors(masks)
+    for mask in masks:
+        assert vecs[mask].tolist() == get_interval_class_vector(
+            PitchClassSet.from_mask(mask)
+        )
+
+
+def test_get_evenness_values():
+    icvs = [ex["icv"] for ex in EXPECTATIONS]
+    expected = [get_evenness(icv) for icv in icvs]
+
+    assert np.allclose(get_evenness_values(icvs), expected)
+
+
+def test_pc_set_metrics():
+    assert len(PC_SET_METRICS) == 4096
+
+    for mask in [0, 0b000010010001, 0b111111111111]:
+        pcs = PitchClassSet.from_mask(mask)
+        icv = get_interval_class_vector(pcs)
+
+        assert evaluate_pitch_class_set(pcs) == {
+            "pc_cardinality": pcs.cardinality,
+            "interval_class_vector": icv,
+            "evenness": get_evenness(icv),
+            "relative_evenness": get_relative_evenness(
+                get_evenness(icv), pcs.cardinality
+            ),
+        }
+
+
+def test_evaluate_notes():
+    for ex in EXPECTATIONS:
+        metrics = evaluate_notes(ex["notes"])
+
+        assert metrics["num_notes"] == len(ex["notes"])
+        assert metrics["pc_cardinality"] == len(PitchClassSet.from_notes(ex["notes"]))
+        assert metrics["interval_class_vector"] == ex["icv"]
+        assert abs(metrics["evenness"] - ex["evenness"]) < 0.01
+
+    assert evaluate_notes(["C4", "E4", "G5"])["ambitus"] == 19
+
+
+def test_get_relative_evenness():
+    assert get_min_evenness(3) == get_evenness([2, 1, 0, 0, 0, 0])
+    assert get_max_evenness(4) == get_evenness([0, 0, 4, 0, 0, 2])
+
+    assert get_relative_evenness(get_evenness([2, 1, 0, 0, 0, 0]), 3) == 0
+    assert get_relative_evenness(get_evenness([0, 0, 0, 3, 0, 0]), 3) == 1
+    assert get_relative_evenness(0, 1) == 1
+
+    cardinalities = PC_SET_METRICS["pc_cardinality"]
+    relative = get_relative_evenness(PC_SET_METRICS["evenness"], cardinalities)
+    assert (relative >= 0).all() and (relative <= 1).all()
+    assert np.allclose(relative, PC_SET_METRICS["relative_evenness"])
+
+
+def get_overtone_agreement_reference(notes, n_overtones=10):
+    partials = []
+    for note in notes:
+        partials.extend(get_n_overtones_harmonic(get_freq_from_note(note), n_overtones))
+
+    partials = sorted(partials)
+    return sum(partials[i] - partials[i - 1] for i in range(1, len(partials)))
+
+
+def test_get_overtone_agreement():
+    for ex in EXPECTATIONS:
+        expected = get_overtone_agreement_reference(ex["notes"])
+        assert np.isclose(get_overtone_agreement(ex["notes"]), expected)
+
+    assert get_overtone_agreement([]) == 0
+
+    midi_nums = [[60, 64, 67], [69, -1, -1], [-1, -1, -1]]
+    expected = [
+        get_overtone_agreement_reference(["C4", "E4", "G4"]),
+        get_overtone_agreement_reference(["A4"]),
+        0,
+    ]
+    assert np.allclose(get_overtone_agreements(midi_nums), expected)
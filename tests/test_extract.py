@@ -0,0 +1,157 @@
+import numpy as np
+from chord_progressions.extract.midi import (
+    drop_short_notes,
+    quantize_times,
+    round_to_target,
+    simplify_harmony_from_notes,
+    smooth_notes,
+)
+from chord_progressions.extract.midi_harman import (
+    TEMPLATE_IDS,
+    TEMPLATE_LABELS,
+    MinimalSegment,
+    get_cumulative_template_scores,
+    get_segment_label,
+    get_span_label,
+    get_template_score,
+    get_template_score_matrix,
+    get_template_scores,
+    label_notes,
+)
+from chord_progressions.type_templates import TYPE_TEMPLATES
+
+
+def get_notes(notes):
+    dtype = np.dtype([("start", float), ("end", float), ("note", int)])
+    return np.array(notes, dtype=dtype)
+
+
+def test_quantize_times():
+    times = [1.1, 1.2, 1.25, 1.3, 1.4, 1.75]
+
+    assert quantize_times(times, 0.5).tolist() == [1.0, 1.0, 1.0, 1.5, 1.5, 2.0]
+    assert quantize_times(times, 0.5).tolist() == [
+        round_to_target(0.5, t) for t in times
+    ]
+
+
+def test_drop_short_notes():
+    notes = get_notes([(0, 1, 60), (1, 1.1, 62), (1, 1.5, 64)])
+
+    assert drop_short_notes(notes, 0.5).tolist() == [(0, 1, 60), (1, 1.5, 64)]
+
+
+def test_smooth_notes():
+    notes = get_notes(
+        [
+            (0, 0.2, 60),
+            (0.1, 0.3, 64),
+            (0.25, 0.4, 60),
+            (0.3, 0.45, 60),
+            # ends in the next step, so isn't joined
+            (0.4, 0.6, 64),
+            (0.5, 0.7, 64),
+            (0.6, 0.9, 64),
+        ]
+    )
+
+    assert smooth_notes(notes, 0.5).tolist() == [
+        (0, 0.45, 60),
+        (0.1, 0.3, 64),
+        (0.4, 0.6, 64),
+        (0.5, 0.9, 64),
+    ]
+
+    assert len(smooth_notes(notes[:0], 0.5)) == 0
+
+
+def test_simplify_harmony_from_notes():
+    tempos = (np.array([0.0]), np.array([120.0]))
+    notes = get_notes(
+        [
+            (0, 0.24, 60),
+            (0.26, 0.49, 60),
+            (0.1, 0.11, 62),
+            (0.5, 1.01, 64),
+            (1.6, 1.65, 67),
+        ]
+    )
+
+    simplified = simplify_harmony_from_notes(notes, tempos)
+
+    # quantized to half notes, with notes quantized to nothing lasting a half note
+    assert simplified.tolist() == [(0, 1, 60), (0, 1, 64)]
+    assert len(simplify_harmony_from_notes(notes[2:3], tempos)) == 0
+
+
+def test_get_template_scores():
+    pc_weights = {0: 2, 4: 1, 7: 1, 10: 3}
+    scores = get_template_scores(pc_weights)
+
+    assert list(scores) == TEMPLATE_IDS
+
+    for template_id, (rotations, one_indices) in TEMPLATE_LABELS.items():
+        expected = max(
+            get_template_score(pc_weights, rotation, oix)
+            for rotation, oix in zip(rotations, one_indices)
+        )
+        assert scores[template_id] == expected
+
+
+def test_get_template_score_matrix():
+    weights = np.random.default_rng(0).integers(0, 3, (20, 12))
+    scores = get_template_score_matrix(weights)
+
+    assert scores.shape == (20, len(TEMPLATE_IDS))
+
+    for row, w in zip(scores, weights):
+        pc_weights = {pc: weight for pc, weight in enumerate(w) if weight}
+        assert row.tolist() == list(get_template_scores(pc_weights).values())
+
+
+def test_get_segment_label():
+    segment = [MinimalSegment(), MinimalSegment()]
+    segment[0].midi_nums = [60, 64, 67]
+    segment[1].midi_nums = [60, 64, 67, 70]
+
+    score, label = get_segment_label(segment)
+
+    # C-E-G scores 3 - 1 miss against C7, and C-E-G-Bb scores 4
+    assert score == 6
+    assert list(TYPE_TEMPLATES)[label] == "dominant-seventh / german-sixth chord"
+
+
+def test_get_span_label():
+    s_m = [MinimalSegment() for _ in range(5)]
+    for ms, midi_nums in zip(s_m, [[60, 64], [60, 64, 67], [], [57, 60, 64], [62]]):
+        ms.midi_nums = midi_nums
+
+    cumulative_scores = get_cumulative_template_scores(s_m)
+    assert cumulative_scores.shape == (6, len(TEMPLATE_IDS))
+
+    for start in range(5):
+        for end in range(start + 1, 6):
+            expected = get_segment_label(s_m[start:end])
+            assert get_span_label(cumulative_scores, start, end) == expected
+
+
+def test_label_notes():
+    notes = get_notes(
+        [
+            (0, 2, 60),
+            (0, 2, 64),
+            (0, 2, 67),
+            (2, 4, 57),
+            (2, 4, 60),
+            (2, 4, 64),
+        ]
+    )
+
+    labels = label_notes(notes)
+
+    assert [(i["start_time"], i["end_time"]) for i in labels] == [(0, 2), (2, 4)]
+    assert [i["label"] for i in labels] == ["major chord", "minor chord"]
+
+    # a single chord has no segment before the final one
+    labels = label_notes(notes[:3])
+    assert [i["midi_nums"] for i in labels] == [[60, 64, 67]]
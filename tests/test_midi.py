@@ -0,0 +1,344 @@
+import io
+import os
+
+import chord_progressions.io.midi
+import mido
+import numpy as np
+import pretty_midi
+import pytest
+from chord_progressions.chord import Chord
+from chord_progressions.extract.midi import parse_note_array, parse_notes
+from chord_progressions.io.midi import (
+    MidiNoteCache,
+    encode_variable_int,
+    export_progressions_to_midi,
+    get_midi_export_filename,
+    get_midi_from_chord,
+    get_midi_from_progression,
+    get_smf_bytes_from_chord,
+    get_smf_bytes_from_progression,
+    load_midi_notes,
+    parse_midi_notes,
+    save_progression_midi,
+)
+from chord_progressions.midi import (
+    get_beats_from_seconds,
+    get_constant_tempo_changes,
+    get_midi_ticks_from_seconds,
+    get_midi_ticks_from_seconds_array,
+    get_seconds_from_beats,
+    get_seconds_from_midi_ticks,
+    get_seconds_from_midi_ticks_array,
+    unwarp_seconds_from_bpm,
+    warp_seconds_to_bpm,
+)
+from chord_progressions.progression import Progression
+
+
+def get_mido_bytes(mid):
+    f = io.BytesIO()
+    mid.save(file=f)
+    return f.getvalue()
+
+
+def test_encode_variable_int():
+    for value in [0, 1, 127, 128, 480, 16383, 16384, 2**21, 2**28 - 1]:
+        expected = bytes(mido.midifiles.meta.encode_variable_int(value))
+        assert encode_variable_int(value) == expected
+
+    with pytest.raises(ValueError):
+        encode_variable_int(-1)
+
+
+def test_get_smf_bytes_from_progression():
+    progression = Progression(
+        [Chord([60, 64, 67]), Chord([]), Chord([57, 60, 64, 72]), Chord([62])],
+        ["4n", "2n", "1m", "8n"],
+        bpm=97,
+        name="Ré mineur",
+    )
+
+    data = get_smf_bytes_from_progression(progression)
+    assert data == get_mido_bytes(get_midi_from_progression(progression))
+
+    data = get_smf_bytes_from_progression(progression, ticks_per_beat=96)
+    assert data == get_mido_bytes(get_midi_from_progression(progression, 96))
+
+
+def test_get_smf_bytes_from_chord():
+    chord = Chord(["C4", "E4", "G4"])
+
+    data = get_smf_bytes_from_chord(chord, "C4-E4-G4")
+    assert data == get_mido_bytes(get_midi_from_chord(chord, "C4-E4-G4"))
+
+
+def test_to_midi_backends(tmp_path):
+    progression = Progression([Chord([60, 64, 67]), Chord([59, 62, 67])], ["1m", "1m"])
+
+    progression.to_midi(tmp_path / "mido.mid")
+    progression.to_midi(tmp_path / "bytes.mid", backend="bytes")
+
+    assert (tmp_path / "mido.mid").read_bytes() == (tmp_path / "bytes.mid").read_bytes()
+
+    chord = Chord(["C4", "E4", "G4"])
+    assert chord.to_midi(backend="bytes") == get_mido_bytes(chord.to_midi())
+
+    with pytest.raises(ValueError):
+        chord.to_midi(backend="pretty_midi")
+
+
+def get_export_progressions():
+    return [
+        Progression(
+            [Chord([60, 64, 67]), Chord([59, 62, 67])], ["1m", "1m"], name="I V"
+        ),
+        Progression([Chord([57, 60, 64])], ["3x"], name="broken"),
+        Progression([Chord([62, 65, 69])], ["2n"], bpm=90),
+    ]
+
+
+def test_export_progressions_to_midi(tmp_path):
+    progressions = get_export_progressions()
+
+    report = export_progressions_to_midi(
+        progressions, tmp_path / "out", max_workers=2, max_in_flight=1
+    )
+
+    assert [r["name"] for r in report] == ["I V", "broken", ""]
+    assert [r["path"] and os.path.basename(r["path"]) for r in report] == [
+        "0_IV.mid",
+        None,
+        "2.mid",
+    ]
+    assert report[1]["error"].startswith("KeyError")
+    assert sorted(os.listdir(tmp_path / "out")) == ["0_IV.mid", "2.mid"]
+
+    for ix in [0, 2]:
+        assert report[ix]["error"] is None
+        assert report[ix]["seconds"] >= 0
+        with open(report[ix]["path"], "rb") as f:
+            assert f.read() == progressions[ix].to_midi(backend="bytes")
+
+
+def test_save_progression_midi_removes_partial_file(tmp_path, monkeypatch):
+    outpath = tmp_path / "partial.mid"
+
+    def save_partial_midi_bytes(data, outpath):
+        with open(outpath, "wb") as f:
+            f.write(data[:10])
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(
+        chord_progressions.io.midi, "save_midi_bytes", save_partial_midi_bytes
+    )
+
+    with pytest.raises(OSError):
+        save_progression_midi(get_export_progressions()[0], outpath, 480)
+
+    assert not os.path.exists(outpath)
+
+
+def test_get_midi_export_filename():
+    expectations = [
+        ("ii V I", "3_iiVI.mid"),
+        ('a/b\\c: *?"<>|', "3_a_b_c_______.mid"),
+        ("Ré mineur", "3_R_mineur.mid"),
+        ("", "3.mid"),
+    ]
+
+    for name, expected in expectations:
+        progression = Progression([Chord([60])], name=name)
+        assert get_midi_export_filename(progression, 3) == expected
+
+
+def test_export_progressions_to_midi_multitrack(tmp_path):
+    progressions = get_export_progressions()
+    outpath = tmp_path / "all.mid"
+
+    report = export_progressions_to_midi(progressions, outpath, multitrack=True)
+    assert [r["error"] is None for r in report] == [True, False, True]
+    assert [r["path"] for r in report] == [outpath, None, outpath]
+
+    mid = mido.MidiFile(outpath)
+    assert mid.type == 1
+    assert [t.name for t in mid.tracks] == ["", "I V", ""]
+    assert mido.tempo2bpm(mid.tracks[0][1].tempo) == 120
+
+    # a half note at 90 bpm lasts as long as 8 / 3 beats at 120 bpm
+    assert sum(msg.time for msg in mid.tracks[2]) == 1280
+
+
+def write_loader_test_file(path):
+    mid = mido.MidiFile(type=1, ticks_per_beat=220)
+
+    conductor = mido.MidiTrack(
+        [
+            mido.MetaMessage("set_tempo", tempo=600000, time=0),
+            mido.MetaMessage("set_tempo", tempo=400000, time=440),
+            mido.MetaMessage("set_tempo", tempo=400000, time=100),
+            mido.MetaMessage("set_tempo", tempo=1000000, time=300),
+        ]
+    )
+
+    piano = mido.MidiTrack(
+        [
+            mido.MetaMessage("track_name", name="piano"),
+            mido.Message("note_on", note=60, velocity=80, time=0),
+            mido.Message("note_on", note=64, velocity=80, time=0),
+            # a repeated note on is closed by the same note off
+            mido.Message("note_on", note=60, velocity=80, time=100),
+            mido.Message("note_off", note=60, time=200),
+            # a note on with velocity 0 is a note off
+            mido.Message("note_on", note=64, velocity=0, time=0),
+            mido.Message("program_change", program=33, time=0),
+            mido.Message("note_on", note=67, velocity=80, time=10),
+            mido.Message("note_off", note=99, time=10),
+            mido.Message("note_off", note=67, time=1000),
+        ]
+    )
+
+    drums = mido.MidiTrack(
+        [
+            mido.Message("note_on", channel=9, note=36, velocity=100, time=0),
+            mido.Message("note_off", channel=9, note=36, time=220),
+            mido.Message("note_on", channel=1, note=48, velocity=100, time=0),
+            mido.Message("note_off", channel=1, note=48, time=5000),
+        ]
+    )
+
+    mid.tracks += [conductor, piano, drums]
+    mid.save(path)
+
+
+def test_load_midi_notes(tmp_path):
+    path = tmp_path / "notes.mid"
+    write_loader_test_file(path)
+
+    pmid = pretty_midi.PrettyMIDI(str(path))
+    expected = [
+        (n.start, n.end, n.pitch, i.program, i.is_drum)
+        for i in pmid.instruments
+        for n in i.notes
+    ]
+
+    for use_mmap in [False, True]:
+        notes, (tempo_times, tempi) = load_midi_notes(path, use_mmap)
+
+        assert notes.tolist() == expected
+        assert np.array_equal(tempo_times, pmid.get_tempo_changes()[0])
+        assert np.array_equal(tempi, pmid.get_tempo_changes()[1])
+
+    assert np.array_equal(parse_note_array(notes), parse_notes(pmid))
+
+
+def test_parse_midi_notes_invalid():
+    with pytest.raises(OSError):
+        parse_midi_notes(b"RIFF\x00\x00\x00\x00")
+
+
+def test_midi_note_cache(tmp_path):
+    paths = []
+    for ix, notes in enumerate([[60, 64, 67], [62, 65, 69], [64, 67, 71]]):
+        progression = Progression([Chord(notes)], name=str(ix))
+        paths.append(tmp_path / f"{ix}.mid")
+        progression.to_midi(paths[-1], backend="bytes")
+
+    cache = MidiNoteCache(tmp_path / "cache")
+
+    notes, tempos = cache.load(paths[0])
+    cached_notes, cached_tempos = load_midi_notes(paths[0], cache=cache)
+
+    assert (cache.hits, cache.misses, len(cache)) == (1, 1, 1)
+    assert isinstance(cached_notes, np.memmap)
+    assert np.array_equal(cached_notes, notes)
+    assert np.array_equal(cached_tempos[1], tempos[1])
+    assert np.array_equal(notes, load_midi_notes(paths[0])[0])
+
+    # every entry has the same size, so a cache of twice its size holds two entries
+    cache = MidiNoteCache(tmp_path / "cache", max_bytes=2 * cache.nbytes + 1)
+    assert len(cache) == 1
+
+    for path in paths:
+        cache.load(path)
+
+    assert (cache.hits, cache.misses, cache.evictions) == (1, 2, 1)
+    assert len(cache) == 2 and cache.nbytes <= cache.max_bytes
+    assert len(os.listdir(tmp_path / "cache")) == 4
+
+    cache.clear()
+    assert len(cache) == 0 and os.listdir(tmp_path / "cache") == []
+
+
+def test_midi_note_cache_evicted_during_get(tmp_path, monkeypatch):
+    path = tmp_path / "0.mid"
+    Progression([Chord([60, 64, 67])]).to_midi(path, backend="bytes")
+
+    cache = MidiNoteCache(tmp_path / "cache")
+    notes, _ = cache.load(path)
+
+    def evict(entry_path):
+        # another process evicts the entry between loading its arrays and touching it
+        for name in os.listdir(tmp_path / "cache"):
+            os.remove(tmp_path / "cache" / name)
+        raise FileNotFoundError(entry_path)
+
+    monkeypatch.setattr(os, "utime", evict)
+
+    cached_notes, _ = cache.get(cache.get_key(path.read_bytes()))
+
+    assert np.array_equal(cached_notes, notes)
+    assert (cache.hits, len(cache), cache.nbytes) == (1, 0, 0)
+
+
+def test_midi_ticks_arrays_match_scalars():
+    seconds = np.linspace(0, 10, 101)
+    ticks = np.arange(0, 10000, 97)
+
+    for bpm in [60, 97, 133.3]:
+        tempo_changes = get_constant_tempo_changes(bpm)
+
+        expected = [get_midi_ticks_from_seconds(s, bpm, 220) for s in seconds]
+        actual = get_midi_ticks_from_seconds_array(seconds, tempo_changes, 220)
+        assert actual.tolist() == expected
+
+        expected = [get_seconds_from_midi_ticks(t, bpm, 220) for t in ticks]
+        actual = get_seconds_from_midi_ticks_array(ticks, tempo_changes, 220)
+        assert actual.tolist() == expected
+
+
+def test_midi_ticks_are_rounded():
+    # 1 second at 97 bpm is 355.67 ticks of 1 / 220 beat, which rounds up rather than truncates
+    seconds = [0.5, 1.0, 1.3, 2.0]
+    expected = [178, 356, 462, 711]
+
+    assert [get_midi_ticks_from_seconds(s, 97, 220) for s in seconds] == expected
+
+    tempo_changes = get_constant_tempo_changes(97)
+    ticks = get_midi_ticks_from_seconds_array(seconds, tempo_changes, 220)
+    assert ticks.tolist() == expected
+
+
+def test_tempo_map_conversions():
+    # 120 bpm for 2 seconds, then 60 bpm
+    tempo_changes = (np.array([0.0, 2.0]), np.array([120.0, 60.0]))
+    seconds = np.array([0, 1, 2, 3, 4.5])
+
+    beats = get_beats_from_seconds(seconds, tempo_changes)
+    assert beats.tolist() == [0, 2, 4, 5, 6.5]
+    assert np.allclose(get_seconds_from_beats(beats, tempo_changes), seconds)
+
+    ticks = get_midi_ticks_from_seconds_array(seconds, tempo_changes, 480)
+    assert ticks.tolist() == [0, 960, 1920, 2400, 3120]
+    assert np.allclose(
+        get_seconds_from_midi_ticks_array(ticks, tempo_changes, 480), seconds
+    )
+
+    warped = warp_seconds_to_bpm(seconds, tempo_changes, 120)
+    assert warped.tolist() == [0, 1, 2, 2.5, 3.25]
+    assert np.allclose(unwarp_seconds_from_bpm(warped, tempo_changes, 120), seconds)
+
+    # times are unchanged at a constant tempo
+    constant = get_constant_tempo_changes(97)
+    seconds = np.random.default_rng(0).uniform(0, 100, 100)
+    assert np.array_equal(warp_seconds_to_bpm(seconds, constant, 97), seconds)
+    assert np.array_equal(unwarp_seconds_from_bpm(seconds, constant, 97), seconds)
@@ -0,0 +1,137 @@
+import os
+
+import pytest
+from chord_progressions.chord import Chord
+from chord_progressions.extract.midi_harman import extract_progression_from_midi
+from chord_progressions.extract.pipeline import (
+    STAGES,
+    ExtractionPipeline,
+    get_parameter_points,
+    get_stage_breakdown,
+    sweep_extraction_parameters,
+)
+from chord_progressions.progression import Progression
+
+
+@pytest.fixture
+def midi_path(tmp_path):
+    progression = Progression(
+        [Chord([60, 64, 67]), Chord([57, 60, 64]), Chord([55, 59, 62])],
+        ["1m", "1m", "2n"],
+        bpm=100,
+    )
+    path = str(tmp_path / "progression.mid")
+    progression.to_midi(path, backend="bytes")
+    return path
+
+
+def get_cached(result):
+    return [t.cached for t in result.timings]
+
+
+def test_pipeline_matches_extract_progression_from_midi(midi_path):
+    pipeline = ExtractionPipeline()
+    result = pipeline.run(midi_path)
+
+    expected = extract_progression_from_midi(midi_path)
+
+    assert [c.midi_nums for c in result.progression.chords] == [
+        c.midi_nums for c in expected.chords
+    ]
+    assert result.progression.durations == expected.durations
+    assert result.progression.bpm == expected.bpm
+
+    assert list(result.artifacts) == STAGES
+    assert [t.stage for t in result.timings] == STAGES
+    assert get_cached(result) == [False] * 4
+    assert all(t.seconds > 0 and t.peak_bytes > 0 for t in result.timings)
+    assert not result.artifacts["simplify"].notes.flags.writeable
+
+
+def test_pipeline_memoizes_stages(midi_path):
+    pipeline = ExtractionPipeline(trace_memory=False)
+    first = pipeline.run(midi_path)
+
+    assert get_cached(pipeline.run(midi_path)) == [True] * 4
+    assert get_cached(pipeline.run(midi_path, quantize_beat=1 / 4)) == [
+        True,
+        False,
+        False,
+        False,
+    ]
+    assert (pipeline.hits, pipeline.misses, len(pipeline)) == (5, 7, 7)
+
+    result = pipeline.run(midi_path)
+    assert result.progression is first.progression
+    assert all(t.peak_bytes is None for t in result.timings)
+
+    # a modified file is loaded again
+    stat = os.stat(midi_path)
+    os.utime(midi_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert get_cached(pipeline.run(midi_path)) == [False] * 4
+
+    pipeline.clear()
+    assert len(pipeline) == 0
+
+
+def test_pipeline_memo_size(midi_path):
+    pipeline = ExtractionPipeline(memo_size=1, trace_memory=False)
+
+    pipeline.run(midi_path)
+    pipeline.run(midi_path, quantize_beat=1 / 4)
+
+    assert get_cached(pipeline.run(midi_path)) == [True, False, False, False]
+
+
+def test_get_stage_breakdown(midi_path):
+    pipeline = ExtractionPipeline()
+    results = [pipeline.run(midi_path), pipeline.run(midi_path, smooth_beat=1 / 2)]
+
+    df = get_stage_breakdown(results)
+
+    assert list(df.columns) == ["filepath", "stage", "seconds", "peak_bytes", "cached"]
+    assert df.stage.tolist() == STAGES * 2
+    assert df.cached.tolist() == [False] * 4 + [True, False, False, False]
+
+
+def test_get_parameter_points():
+    points = get_parameter_points({"quantize_beat": [1 / 2, 1 / 4], "smooth_beat": [1]})
+
+    assert points == [
+        {"shortest_note": 1 / 64, "smooth_beat": 1, "quantize_beat": 1 / 2},
+        {"shortest_note": 1 / 64, "smooth_beat": 1, "quantize_beat": 1 / 4},
+    ]
+
+    with pytest.raises(ValueError):
+        get_parameter_points({"bpm": [120]})
+
+
+def test_sweep_extraction_parameters(midi_path, tmp_path):
+    missing_path = str(tmp_path / "missing.mid")
+    grid = {"shortest_note": [1 / 64, 1 / 32], "quantize_beat": [1 / 2, 1]}
+
+    df = sweep_extraction_parameters([midi_path, missing_path], grid, max_workers=2)
+
+    assert len(df) == 8
+    assert df.filepath.tolist() == [midi_path] * 4 + [missing_path] * 4
+
+    for _, row in df[:4].iterrows():
+        expected = extract_progression_from_midi(
+            midi_path,
+            shortest_note=row.shortest_note,
+            quantize_beat=row.quantize_beat,
+        )
+        assert row.label_seconds > 0
+        assert [c.midi_nums for c in row.progression.chords] == [
+            c.midi_nums for c in expected.chords
+        ]
+        assert row.progression.durations == expected.durations
+
+    assert df.error[:4].isna().all()
+
+    # both shortest notes drop nothing, so the second one shares the labels of the first,
+    # while quantizing to whole notes moves the end of the last half note
+    assert df.shared[:4].tolist() == [False, False, True, True]
+
+    assert df.progression[4:].isna().all()
+    assert all(e.startswith("FileNotFoundError") for e in df.error[4:])
@@ -1,15 +1,19 @@
+import numpy as np
 import pytest
 from chord_progressions.pitch import (
     MIDI_NOTE_FREQUENCIES,
     MIDI_NOTES,
     create_notes_freqs_table,
     get_freq_from_note,
+    get_freqs_from_midi_nums,
     get_midi_num_from_note,
+    get_midi_nums_from_notes,
     get_midi_nums_list_from_midi_nums_str,
     get_n_overtones_harmonic,
     get_note_from_midi_num,
     get_note_list,
     get_note_name_from_note,
+    get_notes_from_midi_nums,
     get_octave_from_note,
     get_pitch_class_from_note,
 )
@@ -118,3 +122,33 @@ def test_get_midi_nums_list_from_midi_nums_str():
 
 def test_get_n_overtones_harmonic():
     assert get_n_overtones_harmonic(440, 4) == [440, 880, 1320, 1760, 2200]
+
+
+def test_get_midi_nums_from_notes():
+    notes = np.array([[ex["note"] for ex in EXPECTATIONS]] * 2)
+    midi_nums = np.array([[ex["midi_num"] for ex in EXPECTATIONS]] * 2)
+
+    assert (get_midi_nums_from_notes(notes) == midi_nums).all()
+    assert get_midi_nums_from_notes([]).shape == (0,)
+
+    with pytest.raises(ValueError):
+        get_midi_nums_from_notes(["C4", "L5"])
+
+
+def test_get_notes_from_midi_nums():
+    midi_nums = np.array([ex["midi_num"] for ex in EXPECTATIONS])
+
+    assert get_notes_from_midi_nums(midi_nums).tolist() == [
+        ex["note"] for ex in EXPECTATIONS
+    ]
+
+    with pytest.raises(IndexError):
+        get_notes_from_midi_nums([60, 128])
+
+
+def test_get_freqs_from_midi_nums():
+    midi_nums = np.array([ex["midi_num"] for ex in EXPECTATIONS])
+
+    assert get_freqs_from_midi_nums(midi_nums).tolist() == [
+        ex["freq"] for ex in EXPECTATIONS
+    ]
@@ -0,0 +1,61 @@
+import pytest
+from chord_progressions.pitch_class_set import PitchClassSet, invert_mask
+
+C_MAJOR = PitchClassSet([0, 4, 7])
+
+
+def test_instantiate_pitch_class_set():
+    assert C_MAJOR.mask == 0b000010010001
+    assert PitchClassSet.from_midi_nums([48, 52, 67, 72]) == C_MAJOR
+    assert PitchClassSet.from_notes(["C3", "E3", "G4"]) == C_MAJOR
+    assert PitchClassSet.from_template([1, 0, 0, 0, 1, 0, 0, 1, 0, 0, 0, 0]) == C_MAJOR
+    assert PitchClassSet.from_template_str("100010010000") == C_MAJOR
+    assert PitchClassSet.from_mask(0b000010010001) == C_MAJOR
+
+    with pytest.raises(ValueError):
+        PitchClassSet.from_mask(4096)
+
+    with pytest.raises(AttributeError):
+        C_MAJOR.mask = 0
+
+
+def test_template():
+    assert C_MAJOR.template == [1, 0, 0, 0, 1, 0, 0, 1, 0, 0, 0, 0]
+    assert C_MAJOR.template_str == "100010010000"
+    assert list(C_MAJOR) == [0, 4, 7]
+
+
+def test_cardinality():
+    assert C_MAJOR.cardinality == 3
+    assert len(PitchClassSet()) == 0
+    assert len(PitchClassSet(range(12))) == 12
+
+
+def test_rotate():
+    assert C_MAJOR.rotate(2) == PitchClassSet([2, 6, 9])
+    assert C_MAJOR.transpose(5) == PitchClassSet([5, 9, 0])
+    assert C_MAJOR.rotate(12) == C_MAJOR
+    assert len(C_MAJOR.get_rotations()) == 12
+    assert len(PitchClassSet([0, 4, 8]).get_rotations()) == 4
+
+
+def test_invert():
+    assert C_MAJOR.invert() == PitchClassSet([0, 8, 5])
+    assert C_MAJOR.invert(7) == PitchClassSet([7, 3, 0])
+
+    for mask in range(4096):
+        assert invert_mask(invert_mask(mask)) == mask
+
+
+def test_subsets():
+    assert PitchClassSet([0, 4]) <= C_MAJOR
+    assert C_MAJOR >= PitchClassSet([7])
+    assert not C_MAJOR.issubset(PitchClassSet([0, 4]))
+    assert 4 in C_MAJOR
+    assert 16 in C_MAJOR
+    assert 5 not in C_MAJOR
+
+
+def test_hash():
+    assert len({C_MAJOR, PitchClassSet([7, 4, 0]), PitchClassSet([0, 3, 7])}) == 2
+    assert list(range(4096))[C_MAJOR] == C_MAJOR.mask
@@ -1,11 +1,16 @@
+from chord_progressions.pitch_class_set import get_mask_from_pitch_classes, rotate_mask
 from chord_progressions.type_templates import (
+    TYPE_NAMES_BY_MASK,
+    TYPE_NUMS_BY_MASK,
     TYPE_TEMPLATES,
     get_template_from_midi_nums,
     get_template_from_notes,
     get_template_from_pitch_classes,
     get_template_from_template_str,
+    get_type_from_mask,
     get_type_from_midi_nums,
     get_type_from_notes,
+    get_type_from_template,
     get_type_from_type_num,
     get_type_num_from_type,
     get_types_from_type_num_str,
@@ -77,3 +82,25 @@ def test_get_template_from_notes():
     ]
     for ex in expectations:
         assert get_template_from_notes(ex["notes"]) == ex["template"]
+
+
+def test_get_mask_from_pitch_classes():
+    assert get_mask_from_pitch_classes([0, 4, 7]) == 0b000010010001
+    assert get_mask_from_pitch_classes([]) == 0
+
+
+def test_rotate_mask():
+    assert rotate_mask(0b000010010001, 2) == 0b001001000100
+    assert rotate_mask(0b100000000000, 1) == 0b000000000001
+    assert rotate_mask(0b000010010001, 12) == 0b000010010001
+
+
+def test_type_lookup_matches_templates():
+    assert len(TYPE_NAMES_BY_MASK) == 4096
+    assert get_type_from_mask(0) == ""
+
+    for mask in range(1, 4096):
+        template = [(mask >> i) & 1 for i in range(12)]
+        expected = get_type_from_template(template) or ""
+        assert TYPE_NAMES_BY_MASK[mask] == expected
+        assert TYPE_NUMS_BY_MASK[mask] == get_type_num_from_type(expected)